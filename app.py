@@ -7,93 +7,115 @@ from PIL import Image
 # Add current directory to path for imports
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from models.llm import get_chat_model, get_vision_response
+from models.router import stream_with_fallback, get_available_providers
 from models.embeddings import get_embedding_model
 from utils.rag_utils import (
-    process_uploaded_file, 
-    create_vector_store, 
+    ingest_uploaded_file,
     load_vector_store,
-    retrieve_relevant_docs,
-    format_docs_for_context
+    get_collection_name,
+    remove_document,
+    open_knowledge_base,
+    delete_knowledge_base
 )
-from utils.web_search import get_search_context, should_use_web_search
-from utils.image_utils import prepare_image_for_gemini
+from utils.query_router import route_query
+from utils.image_utils import (
+    prepare_image_for_gemini,
+    make_history_image,
+    get_history_image,
+    enforce_history_image_budget
+)
+from utils.context_utils import gather_context, build_additional_context
+from utils.history_utils import new_history_state, prepare_history
+from utils.response_cache import fingerprint, get_cached_response, store_response
 from config.config import (
     DEFAULT_SYSTEM_PROMPT,
     CONCISE_INSTRUCTION,
     DETAILED_INSTRUCTION,
     CONCISE_MAX_TOKENS,
     DETAILED_MAX_TOKENS,
+    RESPONSE_CACHE_SEMANTIC_ENABLED,
     SUPPORTED_FILE_TYPES,
     MAX_FILE_SIZE_MB,
     SUPPORTED_IMAGE_TYPES,
     MAX_IMAGE_SIZE_MB,
-    GOOGLE_API_KEY
+    GOOGLE_API_KEY,
+    DEFAULT_USER_ID,
+    DEFAULT_COURSE_ID
 )
 
+# User-facing names for context sources reported by gather_context
+CONTEXT_SOURCE_LABELS = {
+    "rag": "RAG retrieval",
+    "web": "Web search",
+    "image": "Image analysis"
+}
+
 
-def get_chat_response(chat_model, messages, system_prompt, use_rag=False, use_web_search=False, query=""):
+def build_chat_messages(messages, system_prompt, query="", additional_context="", history_summary=""):
     """
-    Get response from the chat model with optional RAG and web search
+    Build the list of LangChain messages for a chat request
     
     Args:
-        chat_model: LLM model instance
-        messages: Conversation history
+        messages: Conversation history to replay (excluding the current query)
         system_prompt: System prompt for the model
-        use_rag: Whether to use RAG for context
-        use_web_search: Whether to use web search
         query: Current user query
+        additional_context: Pre-gathered RAG / web search context
+        history_summary: Rolling summary of older turns not replayed verbatim
     
     Returns:
-        str: Model response
+        list: Formatted messages ready for the chat model
+    """
+    # Prepare messages for the model
+    formatted_messages = [SystemMessage(content=system_prompt)]
+    
+    if history_summary:
+        formatted_messages.append(SystemMessage(content=f"Summary of the earlier conversation:\n{history_summary}"))
+    
+    # Add conversation history
+    for msg in messages:
+        if msg["role"] == "user":
+            formatted_messages.append(HumanMessage(content=msg["content"]))
+        else:
+            formatted_messages.append(AIMessage(content=msg["content"]))
+    
+    # Add current query with context
+    current_query = query
+    if additional_context:
+        current_query = f"{additional_context}\n\n**User Question:** {query}"
+    
+    formatted_messages.append(HumanMessage(content=current_query))
+    
+    return formatted_messages
+
+
+def stream_routed_chat_response(formatted_messages, provider, max_tokens=None, route_info=None):
+    """
+    Stream a response with automatic failover and hedging across configured providers
+    
+    Args:
+        formatted_messages: Messages built by build_chat_messages
+        provider: Provider chosen by the user
+        max_tokens: Maximum tokens in response
+        route_info: Optional dict that receives the serving "provider", and "error" if the stream failed
+    
+    Yields:
+        str: Text chunks of the model response as they arrive
     """
     try:
-        # Build context from RAG if enabled
-        rag_context = ""
-        if use_rag and "vector_store" in st.session_state and st.session_state.vector_store is not None:
-            try:
-                relevant_docs = retrieve_relevant_docs(query, st.session_state.vector_store)
-                if relevant_docs:
-                    rag_context = "\n\n**Context from uploaded documents:**\n" + format_docs_for_context(relevant_docs)
-            except Exception as e:
-                st.warning(f"RAG retrieval failed: {str(e)}")
-        
-        # Build context from web search if enabled
-        web_context = ""
-        if use_web_search:
-            try:
-                web_results = get_search_context(query)
-                if web_results and web_results != "No search results found.":
-                    web_context = "\n\n**Recent information from web search:**\n" + web_results
-            except Exception as e:
-                st.warning(f"Web search failed: {str(e)}")
-        
-        # Combine contexts
-        additional_context = rag_context + web_context
-        
-        # Prepare messages for the model
-        formatted_messages = [SystemMessage(content=system_prompt)]
-        
-        # Add conversation history
-        for msg in messages[:-1]:  # Exclude the last message (current query)
-            if msg["role"] == "user":
-                formatted_messages.append(HumanMessage(content=msg["content"]))
-            else:
-                formatted_messages.append(AIMessage(content=msg["content"]))
-        
-        # Add current query with context
-        current_query = query
-        if additional_context:
-            current_query = f"{additional_context}\n\n**User Question:** {query}"
-        
-        formatted_messages.append(HumanMessage(content=current_query))
-        
-        # Get response from model
-        response = chat_model.invoke(formatted_messages)
-        return response.content
+        yield from stream_with_fallback(
+            formatted_messages,
+            preferred_provider=provider,
+            temperature=0.7,
+            max_tokens=max_tokens,
+            route_info=route_info
+        )
     
     except Exception as e:
-        return f"Error getting response: {str(e)}"
+        # The failure can come after part of the answer was streamed, so flag it explicitly
+        if route_info is not None:
+            route_info["error"] = str(e)
+        yield f"Error getting response: {str(e)}"
+
 
 def instructions_page():
     """Instructions and setup page"""
@@ -243,6 +265,24 @@ def chat_page():
             help="Gemini 2.0 Flash is the primary model"
         )
         
+        # Knowledge Base Selection (one collection per user and course)
+        st.subheader("🗂️ Knowledge Base")
+        user_id = st.text_input("User ID", value=DEFAULT_USER_ID, key="user_id")
+        course_id = st.text_input("Course", value=DEFAULT_COURSE_ID, key="course_id")
+        collection_name = get_collection_name(user_id or DEFAULT_USER_ID, course_id or DEFAULT_COURSE_ID)
+        
+        if st.session_state.get("collection_name") != collection_name:
+            # Attach to the persisted collection for this user/course (session start or course switch)
+            st.session_state.collection_name = collection_name
+            st.session_state.vector_store = None
+            st.session_state.uploaded_docs = []
+            try:
+                vector_store, documents = open_knowledge_base(collection_name)
+                st.session_state.vector_store = vector_store
+                st.session_state.uploaded_docs = documents
+            except Exception as e:
+                st.warning(f"Could not load saved documents: {str(e)}")
+        
         # Feature Toggles
         st.subheader("🔧 Features")
         use_rag = st.checkbox(
@@ -270,19 +310,60 @@ def chat_page():
             if st.button("Process Document", type="primary"):
                 with st.spinner("Processing document..."):
                     try:
-                        file_path, documents, chunks = process_uploaded_file(uploaded_file)
-                        st.session_state.vector_store = create_vector_store(chunks)
+                        if st.session_state.vector_store is None:
+                            st.session_state.vector_store = load_vector_store(collection_name=collection_name)
+                        progress_bar = st.progress(0.0, text="Reading document...")
+                        
+                        def report_progress(done, total):
+                            progress_bar.progress(done / total if total else 1.0, text=f"Embedded {done}/{total} chunks")
+                        
+                        # Stream pages from the upload buffer straight into embedding batches
+                        result = ingest_uploaded_file(
+                            uploaded_file,
+                            st.session_state.vector_store,
+                            progress_callback=report_progress
+                        )
+                        progress_bar.empty()
                         st.session_state.uploaded_docs = st.session_state.get("uploaded_docs", [])
-                        st.session_state.uploaded_docs.append(uploaded_file.name)
-                        st.success(f"✅ Processed {len(chunks)} chunks from {uploaded_file.name}")
+                        if result["doc_id"] not in [doc["doc_id"] for doc in st.session_state.uploaded_docs]:
+                            st.session_state.uploaded_docs.append({
+                                "doc_id": result["doc_id"],
+                                "name": result["name"],
+                                "chunks": result["chunks"]
+                            })
+                        st.success(
+                            f"✅ Processed {result['chunks']} chunks from {result['name']} "
+                            f"({result['added']} newly embedded, {result['chunks'] - result['added']} skipped as already indexed)"
+                        )
                     except Exception as e:
                         st.error(f"❌ Error processing document: {str(e)}")
         
         # Show uploaded documents
+        selected_doc_ids = None
         if "uploaded_docs" in st.session_state and st.session_state.uploaded_docs:
             st.subheader("📚 Loaded Documents")
             for doc in st.session_state.uploaded_docs:
-                st.text(f"✓ {doc}")
+                col_doc, col_remove = st.columns([5, 1])
+                with col_doc:
+                    st.text(f"✓ {doc['name']} ({doc['chunks']} chunks)")
+                with col_remove:
+                    if st.button("❌", help=f"Remove {doc['name']}", key=f"remove_doc_{doc['doc_id']}"):
+                        try:
+                            remove_document(st.session_state.vector_store, doc["doc_id"])
+                            st.session_state.uploaded_docs = [
+                                d for d in st.session_state.uploaded_docs if d["doc_id"] != doc["doc_id"]
+                            ]
+                            st.rerun()
+                        except Exception as e:
+                            st.error(f"❌ Error removing document: {str(e)}")
+            
+            doc_names = {doc["doc_id"]: doc["name"] for doc in st.session_state.uploaded_docs}
+            selected_doc_ids = st.multiselect(
+                "Search only in:",
+                options=list(doc_names.keys()),
+                format_func=lambda doc_id: doc_names[doc_id],
+                help="Leave empty to search all documents in this course"
+            ) or None
     
     # Prepare system prompt based on response mode
     system_prompt = DEFAULT_SYSTEM_PROMPT
@@ -295,34 +376,37 @@ def chat_page():
         system_prompt += DETAILED_INSTRUCTION
         max_tokens = DETAILED_MAX_TOKENS
     
-    # Initialize chat model based on provider
-    try:
-        provider_map = {
-            "Gemini (Primary)": "gemini",
-            "OpenAI": "openai",
-            "Groq": "groq"
-        }
-        chat_model = get_chat_model(
-            provider=provider_map[provider],
-            temperature=0.7,
-            max_tokens=max_tokens
-        )
-    except Exception as e:
-        st.error(f"❌ Failed to initialize model: {str(e)}")
+    # Models are created on demand by the router, which fails over to any configured provider
+    provider_map = {
+        "Gemini (Primary)": "gemini",
+        "OpenAI": "openai",
+        "Groq": "groq"
+    }
+    available_providers = get_available_providers()
+    if not available_providers:
+        st.error("❌ No model provider is configured")
         st.info("💡 Please check your API keys in config/config.py")
         return
+    if provider_map[provider] not in available_providers:
+        st.warning(f"⚠️ No API key for {provider}; answers will come from {', '.join(available_providers)}")
     
     # Initialize chat history
     if "messages" not in st.session_state:
         st.session_state.messages = []
+    if "history_state" not in st.session_state:
+        st.session_state.history_state = new_history_state()
     
     # Display chat messages
     for message in st.session_state.messages:
         with st.chat_message(message["role"]):
             # Display image if present in message
             if "image" in message and message["image"] is not None:
-                st.image(message["image"], caption="Uploaded Image", width=300)
+                image_bytes = get_history_image(message["image"])
+                if image_bytes is not None:
+                    st.image(image_bytes, caption="Uploaded Image", width=300)
             st.markdown(message["content"])
+            if message.get("cached"):
+                st.caption("⚡ Cached response")
     
     # Show attached image preview above chat input
     if "current_image" in st.session_state:
@@ -369,25 +453,29 @@ def chat_page():
         user_message = {
             "role": "user", 
             "content": prompt,
-            "image": current_image_data["image"] if has_image else None
+            "image": make_history_image(current_image_data) if has_image else None
         }
         st.session_state.messages.append(user_message)
+        enforce_history_image_budget(st.session_state.messages)
         
         # Display user message
         with st.chat_message("user"):
             if has_image:
-                st.image(current_image_data["image"], caption="Uploaded Image", width=300)
+                st.image(current_image_data["thumbnail"], caption="Uploaded Image", width=300)
             st.markdown(prompt)
         
-        # Check if web search should be auto-enabled
-        auto_web_search = should_use_web_search(prompt) if not use_web_search else False
-        final_use_web_search = use_web_search or auto_web_search
+        # Decide per query whether retrieval and web search are worth their latency
+        route = route_query(
+            prompt,
+            vector_store=st.session_state.vector_store if use_rag else None,
+            use_web_search=use_web_search
+        )
         
         # Display info about features being used
         features_used = []
-        if use_rag and "vector_store" in st.session_state:
+        if route["use_rag"]:
             features_used.append("📚 RAG")
-        if final_use_web_search:
+        if route["use_web_search"]:
             features_used.append("🌐 Web Search")
         if has_image:
             features_used.append("🖼️ Image Analysis")
@@ -402,41 +490,86 @@ def chat_page():
         # Generate and display bot response
         with st.chat_message("assistant"):
             with st.spinner("Thinking..."):
-                # Build combined prompt with image understanding, RAG, and web search
+                # Fan out image analysis, RAG retrieval and web search concurrently
+                image_url = current_image_data["data_url"] if has_image else None
+                
+                context = gather_context(
+                    prompt,
+                    vector_store=st.session_state.vector_store if route["use_rag"] else None,
+                    doc_ids=selected_doc_ids,
+                    use_web_search=route["use_web_search"],
+                    image_url=image_url,
+                    image_hash=current_image_data["hash"] if has_image else None,
+                    image_perceptual_hash=current_image_data["perceptual_hash"] if has_image else None
+                )
+                for source, error in context["errors"].items():
+                    st.warning(f"{CONTEXT_SOURCE_LABELS[source]} failed: {error}")
+                
+                # Add image context to the prompt
                 combined_prompt = prompt
+                if context["image_analysis"]:
+                    combined_prompt = f"[Image Content]: {context['image_analysis']}\n\n[User Question]: {prompt}"
                 
-                # Add image analysis if present
-                if has_image:
-                    try:
-                        import base64
-                        image_bytes = current_image_data["bytes"]
-                        image_base64 = base64.b64encode(image_bytes).decode('utf-8')
-                        image_url = f"data:image/jpeg;base64,{image_base64}"
-                        
-                        # Get image description/understanding
-                        image_analysis = get_vision_response(
-                            image_url, 
-                            "Describe this image in detail, focusing on any text, diagrams, or educational content."
-                        )
-                        
-                        # Add image context to the prompt
-                        combined_prompt = f"[Image Content]: {image_analysis}\n\n[User Question]: {prompt}"
-                    except Exception as e:
-                        st.warning(f"Image analysis failed: {str(e)}")
+                # Keep replayed history within the token budget, folding older turns into a summary
+                history_summary, recent_messages = prepare_history(
+                    st.session_state.messages[:-1],  # Exclude current message
+                    st.session_state.history_state,
+                    summary_provider=provider_map[provider]
+                )
                 
-                # Get response with RAG and web search
-                response = get_chat_response(
-                    chat_model=chat_model,
-                    messages=st.session_state.messages[:-1],  # Exclude current message
+                # Build the request with RAG and web search context
+                additional_context = build_additional_context(context)
+                formatted_messages = build_chat_messages(
+                    messages=recent_messages,
                     system_prompt=system_prompt,
-                    use_rag=use_rag,
-                    use_web_search=final_use_web_search,
-                    query=combined_prompt
+                    query=combined_prompt,
+                    additional_context=additional_context,
+                    history_summary=history_summary
                 )
+                
+                # Answers are only shared between requests with identical context and history
+                context_fingerprint = fingerprint(
+                    history_summary,
+                    *[msg["content"] for msg in recent_messages],
+                    additional_context,
+                    context["image_analysis"]
+                )
+                cache_embedding_model = None
+                if RESPONSE_CACHE_SEMANTIC_ENABLED:
+                    try:
+                        cache_embedding_model = get_embedding_model()
+                    except Exception:
+                        cache_embedding_model = None
+                cached_response = get_cached_response(
+                    prompt, response_mode, provider_map[provider], context_fingerprint, cache_embedding_model
+                )
+            
+            if cached_response is not None:
+                response = cached_response
                 st.markdown(response)
+                st.caption("⚡ Cached response")
+            else:
+                # Stream the response token by token, failing over to another provider if needed
+                route_info = {}
+                response = st.write_stream(stream_routed_chat_response(
+                    formatted_messages, provider_map[provider], max_tokens, route_info
+                ))
+                served_by = route_info.get("provider")
+                if served_by and served_by != provider_map[provider]:
+                    st.caption(f"↪️ Answered by {served_by} (fallback)")
+                # Never cache a failed or truncated answer; key it by the requested provider, as the lookup is
+                if "error" not in route_info and served_by:
+                    store_response(
+                        prompt, response_mode, provider_map[provider], context_fingerprint, response, cache_embedding_model
+                    )
         
         # Add bot response to chat history
-        st.session_state.messages.append({"role": "assistant", "content": response, "image": None})
+        st.session_state.messages.append({
+            "role": "assistant",
+            "content": response,
+            "image": None,
+            "cached": cached_response is not None
+        })
         
         # Clear attached image after sending
         if has_image:
@@ -473,13 +606,25 @@ def main():
             st.markdown("---")
             if st.button("🗑️ Clear Chat History", use_container_width=True):
                 st.session_state.messages = []
+                st.session_state.history_state = new_history_state()
                 st.rerun()
             
-            if st.button("🔄 Reset Vector Store", use_container_width=True):
-                st.session_state.vector_store = None
-                st.session_state.uploaded_docs = []
-                st.success("Vector store reset!")
-                st.rerun()
+            if st.button(
+                "🔄 Reset Vector Store",
+                use_container_width=True,
+                help="Delete every document in the current user/course knowledge base"
+            ):
+                try:
+                    if st.session_state.get("collection_name"):
+                        delete_knowledge_base(st.session_state.collection_name)
+                    st.session_state.vector_store = None
+                    st.session_state.uploaded_docs = []
+                    # Re-attach on the next run; the collection is now empty
+                    st.session_state.collection_name = None
+                    st.success("Vector store reset!")
+                    st.rerun()
+                except Exception as e:
+                    st.error(f"❌ Error resetting vector store: {str(e)}")
         
         # Footer
         st.markdown("---")
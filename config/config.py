@@ -31,15 +31,101 @@ except (ImportError, FileNotFoundError):
 DEFAULT_LLM_MODEL = "gemini-2.0-flash"  # Google Gemini 2.0 Flash
 DEFAULT_EMBEDDING_MODEL = "models/embedding-001"  # Google's embedding model
 
+# Embedding Provider: "google" (Gemini API) or "local" (sentence-transformers on CPU)
+# Vectors from different providers have different dimensions, so switching provider needs a fresh vector store
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "google")
+LOCAL_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+LOCAL_EMBEDDING_BATCH_SIZE = 64
+
+# Provider Routing Settings
+# Requests fail over to other configured providers, and may be hedged to a second provider
+# when the chosen one has not produced a first token within its recent p95 latency
+PROVIDER_FALLBACK_ENABLED = True
+PROVIDER_HEDGING_ENABLED = True
+PROVIDER_STATS_WINDOW = 50  # Recent calls tracked per provider
+PROVIDER_MIN_SAMPLES = 5  # Calls needed before latency / error stats are trusted
+PROVIDER_ERROR_RATE_THRESHOLD = 0.5  # Providers above this error rate are tried last
+PROVIDER_HEDGE_PERCENTILE = 0.95
+PROVIDER_HEDGE_MIN_DELAY_SECONDS = 1.0
+ROUTER_MAX_WORKERS = 8  # Threads opening provider streams (primary and hedged requests)
+
+# Embedding Cache Settings
+# Embeddings are cached on disk (SQLite) keyed by model name + text hash, with an in-memory LRU front
+EMBEDDING_CACHE_ENABLED = True
+EMBEDDING_CACHE_PATH = "./cache/embeddings.sqlite3"
+EMBEDDING_CACHE_MAX_ENTRIES = 200000  # On-disk entries before oldest are evicted
+EMBEDDING_CACHE_MEMORY_ENTRIES = 5000  # In-memory LRU entries
+
+# Chat Model Pool Settings
+# Clients are shared across sessions and reruns, keyed by (provider, model, temperature, max_tokens)
+MODEL_POOL_MAX_SIZE = 8
+
 # RAG Configuration
-CHUNK_SIZE = 1000
-CHUNK_OVERLAP = 200
+# Chunks are measured in model tokens (TIKTOKEN_ENCODING) and follow paragraph and heading boundaries
+CHUNK_SIZE_TOKENS = 256
+CHUNK_OVERLAP_TOKENS = 32  # Trailing whole paragraphs repeated at the start of the next chunk
 MAX_RETRIEVED_DOCS = 4
 
+# Vector Retrieval Mode
+# "similarity": k nearest chunks; "mmr": maximal marginal relevance (diverse chunks);
+# "threshold": only chunks with relevance score >= RETRIEVAL_SCORE_THRESHOLD (can return none)
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "similarity")
+RETRIEVAL_SCORE_THRESHOLD = 0.5  # Relevance score in [0, 1]
+MMR_FETCH_K = 20  # Candidates MMR picks from
+MMR_LAMBDA = 0.5  # 1 = pure relevance, 0 = maximal diversity
+
+# Query Routing Settings
+# Each query is checked locally before paying for retrieval or web search (small talk skips both)
+QUERY_ROUTING_ENABLED = True
+# Skip retrieval when no query term occurs in the collection (uses the hybrid search BM25 index)
+QUERY_ROUTER_LEXICAL_CHECK = True
+# Optionally skip retrieval when the query embedding is far from the collection centroid
+QUERY_ROUTER_EMBEDDING_CHECK = False
+QUERY_ROUTER_MIN_SIMILARITY = 0.3  # Cosine similarity to the centroid; tune per embedding model
+
+# Hybrid Retrieval Settings (BM25 lexical index fused with vector search)
+HYBRID_SEARCH_ENABLED = True
+HYBRID_VECTOR_K = 3  # Vector hits fed into fusion (lexical hits cover exact terms)
+HYBRID_LEXICAL_K = 3  # BM25 hits fed into fusion
+RRF_K = 60  # Reciprocal rank fusion constant
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Context Compression Settings
+# Retrieved chunks are deduplicated, adjacent chunks of one source merged, and the result trimmed to a token budget
+CONTEXT_TOKEN_BUDGET = 1200
+# Optional local cross-encoder re-ranker, e.g. "cross-encoder/ms-marco-MiniLM-L-6-v2" (needs sentence-transformers)
+RERANKER_MODEL = None
+RERANK_CANDIDATES = 8  # Chunks retrieved for re-ranking when a re-ranker is configured
+
+# Ingestion Pipeline Settings
+INGEST_BATCH_SIZE = 64  # Chunks embedded per request
+INGEST_MAX_CONCURRENCY = 4  # Batches embedded in parallel
+INGEST_MAX_RETRIES = 5  # Retries per batch on rate limit / transient errors
+INGEST_BACKOFF_BASE_SECONDS = 1.0  # Backoff doubles on every retry
+INGEST_BACKOFF_MAX_SECONDS = 30.0
+
 # Response Mode Settings
 CONCISE_MAX_TOKENS = 150
 DETAILED_MAX_TOKENS = 1000
 
+# Response Cache Settings
+# Answers are cached per normalized query + response mode + provider + context fingerprint
+RESPONSE_CACHE_ENABLED = True
+RESPONSE_CACHE_MAX_ENTRIES = 1000
+RESPONSE_CACHE_TTL_SECONDS = 6 * 60 * 60
+# Optional second tier: reuse answers to near-identical questions (costs one query embedding per miss)
+RESPONSE_CACHE_SEMANTIC_ENABLED = False
+RESPONSE_CACHE_SIMILARITY_THRESHOLD = 0.95
+
+# Conversation History Settings
+# History is measured in tokens; once unsummarized turns exceed the budget, older turns are
+# folded into a rolling summary and only the newest HISTORY_KEEP_TOKENS worth of turns are replayed
+TIKTOKEN_ENCODING = "cl100k_base"
+HISTORY_TOKEN_BUDGET = 2000
+HISTORY_KEEP_TOKENS = 1000
+HISTORY_SUMMARY_MAX_TOKENS = 250
+
 # System Prompts
 DEFAULT_SYSTEM_PROMPT = """You are an intelligent E-Learning & Education Assistant. You help students and learners with:
 - Explaining complex concepts in simple terms
@@ -52,10 +138,30 @@ Provide accurate, educational, and encouraging responses. Use examples and analo
 
 CONCISE_INSTRUCTION = "\n\nProvide a brief, concise response (2-3 sentences maximum)."
 DETAILED_INSTRUCTION = "\n\nProvide a comprehensive, detailed response with explanations, examples, and actionable insights."
+HISTORY_SUMMARY_PROMPT = """You maintain a running summary of a tutoring conversation between a student and an AI study assistant.
+Update the existing summary with the new conversation turns. Keep the topics covered, key facts and explanations given, and any open questions or preferences the student expressed. Be brief and factual."""
+
+# Context Gathering Settings
+# RAG retrieval, web search and image analysis run concurrently; each source gets its own timeout
+CONTEXT_MAX_WORKERS = 8
+RAG_TIMEOUT_SECONDS = 10
+WEB_SEARCH_TIMEOUT_SECONDS = 10
+IMAGE_ANALYSIS_TIMEOUT_SECONDS = 30
 
 # Web Search Settings
 WEB_SEARCH_ENABLED = True
 MAX_SEARCH_RESULTS = 5
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "serper")  # "serper" or "stub" (offline, for tests)
+SEARCH_TIMEOUT_SECONDS = 10
+SEARCH_POOL_SIZE = 10  # Keep-alive connections held open to the search API
+SEARCH_CACHE_TTL_SECONDS = 300  # Identical searches within this window are served locally
+SEARCH_CACHE_MAX_ENTRIES = 256
+SEARCH_MAX_RETRIES = 2  # Retries on rate limit / timeout, within the latency budget
+SEARCH_BACKOFF_BASE_SECONDS = 0.5  # Backoff doubles on every retry
+SEARCH_MIN_ATTEMPT_SECONDS = 0.5  # Don't start an attempt with less budget than this left
+SEARCH_HEDGE_DELAY_SECONDS = None  # Send a duplicate request if no reply after this long (None disables; costs quota)
+SEARCH_BREAKER_FAILURE_THRESHOLD = 3  # Consecutive failures before search is short-circuited
+SEARCH_BREAKER_COOLDOWN_SECONDS = 60  # How long search stays disabled once the breaker opens
 
 # Document Upload Settings
 SUPPORTED_FILE_TYPES = ["pdf", "txt", "docx", "md"]
@@ -65,7 +171,32 @@ MAX_FILE_SIZE_MB = 10
 SUPPORTED_IMAGE_TYPES = ["png", "jpg", "jpeg", "webp"]
 MAX_IMAGE_SIZE_MB = 5
 IMAGE_MAX_DIMENSIONS = (1024, 1024)  # Max width and height
+IMAGE_TARGET_BYTES = 400 * 1024  # Byte budget for the payload sent to the vision API
+IMAGE_QUALITY_STEPS = (85, 75, 65, 50)  # Lossy qualities tried, best first, until the payload fits
+
+# Chat History Image Settings
+# History keeps small thumbnails plus a content-addressed blob on disk, never decoded images
+IMAGE_BLOB_DIRECTORY = "./cache/image_blobs"
+IMAGE_BLOB_MAX_BYTES = 500 * 1024 * 1024  # On-disk blob bytes before least recently used blobs are evicted
+IMAGE_THUMBNAIL_SIZE = (300, 300)
+HISTORY_IMAGE_MAX_BYTES = 2 * 1024 * 1024  # Per-session cap on thumbnails held in memory
+IMAGE_ANALYSIS_PROMPT = "Describe this image in detail, focusing on any text, diagrams, or educational content."
+
+# Image Analysis Cache Settings
+# Descriptions are cached on disk by a content hash of the processed image, so re-uploads of the
+# same image skip the vision call
+IMAGE_ANALYSIS_CACHE_ENABLED = True
+IMAGE_ANALYSIS_CACHE_PATH = "./cache/image_analysis.sqlite3"
+IMAGE_ANALYSIS_CACHE_MAX_ENTRIES = 1000
+# Optional second tier: reuse the description of a near-identical image (perceptual dHash).
+# Off by default: slides from one deck can hash alike while their text differs
+IMAGE_HASH_FUZZY_MATCH = False
+IMAGE_HASH_SIZE = 16  # dHash grid size (16 -> 256-bit hash)
+IMAGE_HASH_MAX_DISTANCE = 2  # Max differing bits for two images to count as the same
 
 # Vector Store Settings
 VECTOR_STORE_PATH = "vector_store"
 PERSIST_DIRECTORY = "./chroma_db"
+# Each user/course pair gets its own Chroma collection, namespaced by embedding provider
+DEFAULT_USER_ID = "default"
+DEFAULT_COURSE_ID = "general"
@@ -0,0 +1,219 @@
+"""
+Bulk ingestion of a course folder into the knowledge base
+
+Usage:
+    python ingest.py sample_documents --course general --workers 4
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Add current directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from utils.rag_utils import (
+    load_document,
+    split_documents,
+    compute_document_id,
+    get_collection_name,
+    load_vector_store,
+    add_documents_to_vector_store,
+    remove_document,
+    has_document,
+    get_ingest_manifest_path
+)
+from config.config import (
+    SUPPORTED_FILE_TYPES,
+    PERSIST_DIRECTORY,
+    DEFAULT_USER_ID,
+    DEFAULT_COURSE_ID
+)
+
+
+def find_documents(directory):
+    """
+    Recursively find supported documents in a directory
+    
+    Args:
+        directory (str): Directory to walk
+    
+    Returns:
+        list: Sorted file paths
+    """
+    extensions = {f".{file_type}" for file_type in SUPPORTED_FILE_TYPES}
+    paths = []
+    for root, _, files in os.walk(directory):
+        for file_name in files:
+            if os.path.splitext(file_name)[1].lower() in extensions:
+                paths.append(os.path.join(root, file_name))
+    return sorted(paths)
+
+
+def parse_document(file_path, document_name, doc_id):
+    """
+    Load and split one document (runs in a worker process)
+    
+    Args:
+        file_path (str): Path to the document
+        document_name (str): Name stored in chunk metadata
+        doc_id (str): Document id stored in chunk metadata
+    
+    Returns:
+        list: Chunked Document objects
+    """
+    documents = load_document(file_path)
+    for doc in documents:
+        doc.metadata["doc_id"] = doc_id
+        doc.metadata["document_name"] = document_name
+    return split_documents(documents)
+
+
+def load_manifest(manifest_path):
+    """Load the record of already ingested files (path -> doc_id)"""
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest_path, manifest):
+    """Atomically write the ingestion manifest"""
+    os.makedirs(os.path.dirname(manifest_path) or ".", exist_ok=True)
+    temp_path = f"{manifest_path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(temp_path, manifest_path)
+
+
+def ingest_directory(directory, user_id=DEFAULT_USER_ID, course_id=DEFAULT_COURSE_ID, workers=None,
+                     persist_directory=PERSIST_DIRECTORY, force=False):
+    """
+    Ingest every supported document in a directory into a course knowledge base
+    
+    Files are parsed and split in a process pool (PDF parsing is CPU-bound);
+    the main process feeds the resulting chunks into the shared batched
+    embedding/upsert stage. A manifest next to the vector store records
+    finished files, so an interrupted run resumes where it stopped and
+    unchanged files are skipped on later runs, as long as their chunks are
+    still in the collection (a document removed from the app is re-ingested).
+    When a file has changed, the chunks of its previous version are removed
+    before the new ones are added.
+    
+    Args:
+        directory (str): Directory to ingest
+        user_id (str): User identifier
+        course_id (str): Course identifier
+        workers (int): Number of parsing processes (defaults to CPU count)
+        persist_directory (str): Directory where vector stores are persisted
+        force (bool): Re-process files already recorded in the manifest
+    
+    Returns:
+        dict: Run summary
+    """
+    started = time.monotonic()
+    collection_name = get_collection_name(user_id, course_id)
+    manifest_path = get_ingest_manifest_path(collection_name, persist_directory)
+    manifest = load_manifest(manifest_path)
+    vector_store = load_vector_store(persist_directory, collection_name)
+    
+    summary = {
+        "collection": collection_name,
+        "files": 0,
+        "skipped": 0,
+        "failed": 0,
+        "chunks": 0,
+        "added": 0,
+        "bytes": 0
+    }
+    
+    jobs = []
+    for file_path in find_documents(directory):
+        document_name = os.path.relpath(file_path, directory)
+        with open(file_path, "rb") as f:
+            file_bytes = f.read()
+        doc_id = compute_document_id(file_bytes)
+        
+        if (not force and manifest.get(document_name, {}).get("doc_id") == doc_id
+                and has_document(vector_store, doc_id)):
+            summary["skipped"] += 1
+            continue
+        
+        summary["bytes"] += len(file_bytes)
+        jobs.append((file_path, document_name, doc_id))
+    
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(parse_document, file_path, document_name, doc_id): (document_name, doc_id)
+            for file_path, document_name, doc_id in jobs
+        }
+        
+        for future in as_completed(futures):
+            document_name, doc_id = futures[future]
+            try:
+                chunks = future.result()
+                
+                # Drop the previous version of a changed file, unless another file has the same content
+                old_doc_id = manifest.get(document_name, {}).get("doc_id")
+                if old_doc_id and old_doc_id != doc_id and not any(
+                    entry.get("doc_id") == old_doc_id
+                    for name, entry in manifest.items() if name != document_name
+                ):
+                    remove_document(vector_store, old_doc_id)
+                
+                added = add_documents_to_vector_store(vector_store, chunks)
+            except Exception as e:
+                summary["failed"] += 1
+                print(f"  FAILED   {document_name}: {str(e)}")
+                continue
+            
+            summary["files"] += 1
+            summary["chunks"] += len(chunks)
+            summary["added"] += added
+            manifest[document_name] = {"doc_id": doc_id, "chunks": len(chunks)}
+            save_manifest(manifest_path, manifest)
+            print(f"  ingested {document_name}: {len(chunks)} chunks ({added} new)")
+    
+    summary["seconds"] = time.monotonic() - started
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-ingest a folder of study materials into the knowledge base")
+    parser.add_argument("directory", help="Folder to ingest (searched recursively)")
+    parser.add_argument("--user", default=DEFAULT_USER_ID, help="User ID owning the knowledge base")
+    parser.add_argument("--course", default=DEFAULT_COURSE_ID, help="Course the documents belong to")
+    parser.add_argument("--workers", type=int, default=None, help="Parsing processes (default: CPU count)")
+    parser.add_argument("--persist-directory", default=PERSIST_DIRECTORY, help="Vector store directory")
+    parser.add_argument("--force", action="store_true", help="Re-process files already ingested")
+    args = parser.parse_args()
+    
+    if not os.path.isdir(args.directory):
+        parser.error(f"Not a directory: {args.directory}")
+    
+    print(f"Ingesting {args.directory} into user '{args.user}', course '{args.course}'")
+    summary = ingest_directory(
+        args.directory,
+        user_id=args.user,
+        course_id=args.course,
+        workers=args.workers,
+        persist_directory=args.persist_directory,
+        force=args.force
+    )
+    
+    seconds = max(summary["seconds"], 1e-9)
+    print(f"\nCollection:  {summary['collection']}")
+    print(f"Files:       {summary['files']} ingested, {summary['skipped']} unchanged, {summary['failed']} failed")
+    print(f"Chunks:      {summary['chunks']} total, {summary['added']} newly embedded")
+    print(f"Time:        {summary['seconds']:.1f}s")
+    print(f"Throughput:  {summary['chunks'] / seconds:.1f} chunks/s, "
+          f"{summary['bytes'] / seconds / (1024 * 1024):.2f} MB/s")
+    
+    if summary["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,13 @@
 import os
 import sys
+import time
+import sqlite3
+import hashlib
+import threading
+from array import array
+from collections import OrderedDict
 
+from langchain_core.embeddings import Embeddings
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 
 # Add parent directory to path for imports
@@ -8,27 +15,317 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(current_dir)
 sys.path.insert(0, parent_dir)
 
-from config.config import GOOGLE_API_KEY, DEFAULT_EMBEDDING_MODEL
+from config.config import (
+    GOOGLE_API_KEY,
+    DEFAULT_EMBEDDING_MODEL,
+    EMBEDDING_PROVIDER,
+    LOCAL_EMBEDDING_MODEL,
+    LOCAL_EMBEDDING_BATCH_SIZE,
+    RERANKER_MODEL,
+    EMBEDDING_CACHE_ENABLED,
+    EMBEDDING_CACHE_PATH,
+    EMBEDDING_CACHE_MAX_ENTRIES,
+    EMBEDDING_CACHE_MEMORY_ENTRIES
+)
 
+# Process-wide in-memory LRU front shared by all CachedEmbeddings instances;
+# vectors are held as float32 arrays (4 bytes per dimension instead of a list of floats)
+_memory_cache = OrderedDict()
+_memory_cache_lock = threading.Lock()
 
-def get_embedding_model():
+# Loaded sentence-transformers models, shared process-wide (loading is slow)
+_local_models = {}
+_local_models_lock = threading.Lock()
+
+# One SQLite connection per cache file, shared across threads behind a lock
+_disk_connections = {}
+_disk_lock = threading.Lock()
+
+# Approximate row count per cache file, so eviction does not need a COUNT(*) on every write
+_disk_counts = {}
+
+# Fraction of max_entries the disk cache is trimmed to when it overflows, so eviction runs rarely
+EVICTION_TARGET_RATIO = 0.9
+
+
+def _get_disk_connection(cache_path):
+    """Open (once) the SQLite embedding cache at cache_path"""
+    if cache_path not in _disk_connections:
+        directory = os.path.dirname(cache_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        connection = sqlite3.connect(cache_path, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_access REAL NOT NULL)"
+        )
+        connection.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON embeddings (last_access)")
+        connection.commit()
+        _disk_connections[cache_path] = connection
+        _disk_counts[cache_path] = connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+    
+    return _disk_connections[cache_path]
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embedding model wrapper with an in-memory LRU and a persistent SQLite cache
+    
+    Vectors are keyed by model name, embedding kind (query or document) and a
+    hash of the text, so identical texts are only ever embedded once. The
+    wrapper implements the LangChain Embeddings interface and can be passed
+    directly to Chroma.
+    """
+    
+    def __init__(self, embedding_model, model_name, cache_path=EMBEDDING_CACHE_PATH,
+                 max_entries=EMBEDDING_CACHE_MAX_ENTRIES, memory_entries=EMBEDDING_CACHE_MEMORY_ENTRIES):
+        self.embedding_model = embedding_model
+        self.model_name = model_name
+        self.cache_path = cache_path
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+    
+    def _make_key(self, kind, text):
+        digest = hashlib.sha256(f"{self.model_name}\0{kind}\0{text}".encode("utf-8")).hexdigest()
+        return f"{self.cache_path}:{digest}"
+    
+    def _remember(self, key, vector):
+        """Keep a float32 array in the in-memory LRU"""
+        with _memory_cache_lock:
+            _memory_cache[key] = vector
+            _memory_cache.move_to_end(key)
+            while len(_memory_cache) > self.memory_entries:
+                _memory_cache.popitem(last=False)
+    
+    def _lookup(self, keys):
+        """Return {key: float32 array} for keys found in memory or on disk"""
+        found = {}
+        with _memory_cache_lock:
+            for key in keys:
+                if key in _memory_cache:
+                    _memory_cache.move_to_end(key)
+                    found[key] = _memory_cache[key]
+        
+        missing = [key for key in keys if key not in found]
+        if missing:
+            with _disk_lock:
+                connection = _get_disk_connection(self.cache_path)
+                for start in range(0, len(missing), 500):
+                    batch = missing[start:start + 500]
+                    placeholders = ",".join("?" * len(batch))
+                    rows = connection.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                    ).fetchall()
+                    for key, blob in rows:
+                        found[key] = array("f", blob)
+                    if rows:
+                        connection.execute(
+                            f"UPDATE embeddings SET last_access = ? WHERE key IN ({placeholders})",
+                            [time.time()] + batch
+                        )
+                connection.commit()
+            
+            for key in missing:
+                if key in found:
+                    self._remember(key, found[key])
+        
+        return found
+    
+    def _store(self, items):
+        """
+        Persist {key: vector} to memory and disk
+        
+        When the disk cache grows past max_entries, the least recently used
+        entries are evicted down to EVICTION_TARGET_RATIO of the limit, so the
+        table is only counted and trimmed once in a while.
+        """
+        now = time.time()
+        vectors = {key: array("f", vector) for key, vector in items.items()}
+        for key, vector in vectors.items():
+            self._remember(key, vector)
+        
+        with _disk_lock:
+            connection = _get_disk_connection(self.cache_path)
+            # Keys hash the model and text, so an existing row already holds the same vector
+            cursor = connection.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, vector, last_access) VALUES (?, ?, ?)",
+                [(key, vector.tobytes(), now) for key, vector in vectors.items()]
+            )
+            _disk_counts[self.cache_path] += max(cursor.rowcount, 0)
+            
+            if _disk_counts[self.cache_path] > self.max_entries:
+                # Other processes may share the file; recount before trimming
+                count = connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+                target = int(self.max_entries * EVICTION_TARGET_RATIO)
+                if count > self.max_entries:
+                    connection.execute(
+                        "DELETE FROM embeddings WHERE key IN "
+                        "(SELECT key FROM embeddings ORDER BY last_access ASC LIMIT ?)",
+                        (count - target,)
+                    )
+                    count = target
+                _disk_counts[self.cache_path] = count
+            connection.commit()
+    
+    def embed_documents(self, texts):
+        keys = [self._make_key("document", text) for text in texts]
+        found = self._lookup(list(dict.fromkeys(keys)))
+        
+        # Embed each distinct uncached text once
+        pending = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in pending:
+                pending[key] = text
+        
+        if pending:
+            vectors = self.embedding_model.embed_documents(list(pending.values()))
+            computed = dict(zip(pending.keys(), vectors))
+            self._store(computed)
+            found.update(computed)
+        
+        return [list(found[key]) for key in keys]
+    
+    def embed_query(self, text):
+        key = self._make_key("query", text)
+        found = self._lookup([key])
+        if key in found:
+            return list(found[key])
+        
+        vector = self.embedding_model.embed_query(text)
+        self._store({key: vector})
+        return vector
+
+
+class LocalEmbeddings(Embeddings):
+    """
+    CPU embedding backend using a local sentence-transformers model
+    
+    Texts are encoded in batches of batch_size using all available CPU cores,
+    with no network round-trips.
+    """
+    
+    def __init__(self, model, batch_size=LOCAL_EMBEDDING_BATCH_SIZE):
+        self.model = model
+        self.batch_size = batch_size
+    
+    def embed_documents(self, texts):
+        if not texts:
+            return []
+        vectors = self.model.encode(
+            list(texts),
+            batch_size=self.batch_size,
+            normalize_embeddings=True,
+            show_progress_bar=False
+        )
+        return vectors.tolist()
+    
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def get_local_embedding_model(model_name=LOCAL_EMBEDDING_MODEL, batch_size=LOCAL_EMBEDDING_BATCH_SIZE):
     """
-    Initialize and return the Google Generative AI embedding model
+    Initialize and return a local sentence-transformers embedding model
+    
+    The underlying model is loaded once per process and shared.
+    
+    Args:
+        model_name (str): sentence-transformers model name or path
+        batch_size (int): Number of texts encoded per batch
     
     Returns:
-        GoogleGenerativeAIEmbeddings: Configured embedding model
+        LocalEmbeddings: Configured local embedding model
+    
+    Raises:
+        RuntimeError: If the model fails to load
+    """
+    try:
+        with _local_models_lock:
+            if model_name not in _local_models:
+                import torch
+                from sentence_transformers import SentenceTransformer
+                
+                # Use every CPU core for encoding
+                torch.set_num_threads(os.cpu_count() or 1)
+                _local_models[model_name] = SentenceTransformer(model_name, device="cpu")
+        
+        return LocalEmbeddings(_local_models[model_name], batch_size=batch_size)
+    
+    except Exception as e:
+        raise RuntimeError(f"Failed to load local embedding model: {str(e)}")
+
+
+def get_reranker_model(model_name=RERANKER_MODEL):
+    """
+    Initialize and return a local sentence-transformers cross-encoder
+    
+    The model is loaded once per process and shared.
+    
+    Args:
+        model_name (str): Cross-encoder model name or path
+    
+    Returns:
+        CrossEncoder: Loaded cross-encoder
+    
+    Raises:
+        RuntimeError: If the model fails to load
+    """
+    try:
+        key = ("cross-encoder", model_name)
+        with _local_models_lock:
+            if key not in _local_models:
+                import torch
+                from sentence_transformers import CrossEncoder
+                
+                torch.set_num_threads(os.cpu_count() or 1)
+                _local_models[key] = CrossEncoder(model_name, device="cpu")
+        
+        return _local_models[key]
+    
+    except Exception as e:
+        raise RuntimeError(f"Failed to load re-ranker model: {str(e)}")
+
+
+def get_embedding_model(provider=EMBEDDING_PROVIDER):
+    """
+    Initialize and return the embedding model for the configured provider
+    
+    Supported providers are "google" (Gemini embedding API) and "local"
+    (sentence-transformers on CPU). When EMBEDDING_CACHE_ENABLED is set, the
+    model is wrapped in CachedEmbeddings so repeated texts and queries skip
+    re-embedding.
+    
+    Args:
+        provider (str): Embedding provider ("google" or "local")
+    
+    Returns:
+        Embeddings: Configured (and optionally cached) embedding model
     
     Raises:
         RuntimeError: If the embedding model fails to initialize
     """
     try:
-        if not GOOGLE_API_KEY:
-            raise ValueError("Google API key not found. Please set GOOGLE_API_KEY in config.py or environment variables.")
+        provider = provider.lower()
         
-        embeddings = GoogleGenerativeAIEmbeddings(
-            model=DEFAULT_EMBEDDING_MODEL,
-            google_api_key=GOOGLE_API_KEY
-        )
+        if provider == "google":
+            if not GOOGLE_API_KEY:
+                raise ValueError("Google API key not found. Please set GOOGLE_API_KEY in config.py or environment variables.")
+            
+            model_name = DEFAULT_EMBEDDING_MODEL
+            embeddings = GoogleGenerativeAIEmbeddings(
+                model=model_name,
+                google_api_key=GOOGLE_API_KEY
+            )
+        elif provider == "local":
+            model_name = LOCAL_EMBEDDING_MODEL
+            embeddings = get_local_embedding_model(model_name)
+        else:
+            raise ValueError(f"Unsupported embedding provider: {provider}. Choose from 'google' or 'local'.")
+        
+        if EMBEDDING_CACHE_ENABLED:
+            embeddings = CachedEmbeddings(embeddings, model_name)
         
         return embeddings
     
@@ -1,5 +1,7 @@
 import os
 import sys
+import threading
+from collections import OrderedDict
 from PIL import Image
 
 from langchain_google_genai import ChatGoogleGenerativeAI
@@ -16,9 +18,15 @@ from config.config import (
     GOOGLE_API_KEY, 
     OPENAI_API_KEY, 
     GROQ_API_KEY, 
-    DEFAULT_LLM_MODEL
+    DEFAULT_LLM_MODEL,
+    MODEL_POOL_MAX_SIZE
 )
 
+# Process-wide pool of chat model clients, shared across Streamlit sessions and reruns
+# so that warm clients and their HTTP connection pools are reused
+_model_pool = OrderedDict()
+_model_pool_lock = threading.Lock()
+
 
 def get_gemini_model(model_name=DEFAULT_LLM_MODEL, temperature=0.7, max_tokens=None):
     """
@@ -116,10 +124,56 @@ def get_groq_model(model_name="llama-3.1-70b-versatile", temperature=0.7, max_to
         raise RuntimeError(f"Failed to initialize Groq model: {str(e)}")
 
 
+def create_chat_model(provider="gemini", model_name=None, temperature=0.7, max_tokens=None):
+    """
+    Create a new chat model client for the specified provider (bypasses the pool)
+    
+    Args:
+        provider (str): Model provider ("gemini", "openai", or "groq")
+        model_name (str): Optional specific model name
+        temperature (float): Sampling temperature
+        max_tokens (int): Maximum tokens in response
+    
+    Returns:
+        Chat model instance
+    
+    Raises:
+        ValueError: If provider is not supported
+        RuntimeError: If model initialization fails
+    """
+    provider = provider.lower()
+    
+    if provider == "gemini":
+        return get_gemini_model(
+            model_name=model_name or DEFAULT_LLM_MODEL,
+            temperature=temperature,
+            max_tokens=max_tokens
+        )
+    elif provider == "openai":
+        return get_openai_model(
+            model_name=model_name or "gpt-4o-mini",
+            temperature=temperature,
+            max_tokens=max_tokens
+        )
+    elif provider == "groq":
+        return get_groq_model(
+            model_name=model_name or "llama-3.1-70b-versatile",
+            temperature=temperature,
+            max_tokens=max_tokens
+        )
+    else:
+        raise ValueError(f"Unsupported provider: {provider}. Choose from 'gemini', 'openai', or 'groq'.")
+
+
 def get_chat_model(provider="gemini", model_name=None, temperature=0.7, max_tokens=None):
     """
     Get a chat model based on the specified provider
     
+    Clients are cached in a process-wide pool keyed by (provider, model name,
+    temperature, max_tokens), so repeated calls on Streamlit reruns reuse the
+    same client. The least recently used client is evicted once the pool
+    exceeds MODEL_POOL_MAX_SIZE.
+    
     Args:
         provider (str): Model provider ("gemini", "openai", or "groq")
         model_name (str): Optional specific model name
@@ -134,33 +188,40 @@ def get_chat_model(provider="gemini", model_name=None, temperature=0.7, max_toke
         RuntimeError: If model initialization fails
     """
     try:
-        provider = provider.lower()
+        key = (provider.lower(), model_name, temperature, max_tokens)
+        
+        with _model_pool_lock:
+            if key in _model_pool:
+                _model_pool.move_to_end(key)
+                return _model_pool[key]
+        
+        # Build outside the lock so a slow client construction does not block other sessions
+        chat_model = create_chat_model(
+            provider=provider,
+            model_name=model_name,
+            temperature=temperature,
+            max_tokens=max_tokens
+        )
         
-        if provider == "gemini":
-            return get_gemini_model(
-                model_name=model_name or DEFAULT_LLM_MODEL,
-                temperature=temperature,
-                max_tokens=max_tokens
-            )
-        elif provider == "openai":
-            return get_openai_model(
-                model_name=model_name or "gpt-4o-mini",
-                temperature=temperature,
-                max_tokens=max_tokens
-            )
-        elif provider == "groq":
-            return get_groq_model(
-                model_name=model_name or "llama-3.1-70b-versatile",
-                temperature=temperature,
-                max_tokens=max_tokens
-            )
-        else:
-            raise ValueError(f"Unsupported provider: {provider}. Choose from 'gemini', 'openai', or 'groq'.")
+        with _model_pool_lock:
+            # Another session may have created the same client in the meantime
+            chat_model = _model_pool.setdefault(key, chat_model)
+            _model_pool.move_to_end(key)
+            while len(_model_pool) > MODEL_POOL_MAX_SIZE:
+                _model_pool.popitem(last=False)
+        
+        return chat_model
     
     except Exception as e:
         raise RuntimeError(f"Failed to get chat model: {str(e)}")
 
 
+def clear_model_pool():
+    """Drop all pooled chat model clients (e.g. after API keys change)"""
+    with _model_pool_lock:
+        _model_pool.clear()
+
+
 # For backward compatibility
 def get_chatgroq_model():
     """Legacy function for backward compatibility"""
@@ -171,8 +232,12 @@ def get_vision_response(image_data, question, model_name="gemini-2.0-flash"):
     """
     Get response from Gemini Vision model for image analysis
     
+    The vision client is taken from the shared chat model pool, so it is
+    created once per process rather than once per image.
+    
     Args:
-        image_data: PIL Image object or image bytes
+        image_data: Image data URL string, or an image payload dict from
+            prepare_image_for_gemini (its pre-encoded "data_url" is used)
         question (str): Question about the image
         model_name (str): Gemini model with vision capabilities
     
@@ -186,10 +251,13 @@ def get_vision_response(image_data, question, model_name="gemini-2.0-flash"):
         if not GOOGLE_API_KEY:
             raise ValueError("Google API key not found for vision model")
         
-        # Initialize Gemini model with vision support
-        vision_model = ChatGoogleGenerativeAI(
-            model=model_name,
-            google_api_key=GOOGLE_API_KEY,
+        if isinstance(image_data, dict):
+            image_data = image_data["data_url"]
+        
+        # Shared Gemini client with vision support
+        vision_model = get_chat_model(
+            provider="gemini",
+            model_name=model_name,
             temperature=0.4
         )
         
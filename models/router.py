@@ -0,0 +1,247 @@
+import os
+import sys
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# Add parent directory to path for imports
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+from models.llm import get_chat_model
+from config.config import (
+    GOOGLE_API_KEY,
+    OPENAI_API_KEY,
+    GROQ_API_KEY,
+    PROVIDER_FALLBACK_ENABLED,
+    PROVIDER_HEDGING_ENABLED,
+    PROVIDER_STATS_WINDOW,
+    PROVIDER_MIN_SAMPLES,
+    PROVIDER_ERROR_RATE_THRESHOLD,
+    PROVIDER_HEDGE_PERCENTILE,
+    PROVIDER_HEDGE_MIN_DELAY_SECONDS,
+    ROUTER_MAX_WORKERS
+)
+
+PROVIDER_API_KEYS = {
+    "gemini": GOOGLE_API_KEY,
+    "openai": OPENAI_API_KEY,
+    "groq": GROQ_API_KEY
+}
+
+# Rolling (latency, success) samples per provider, shared by all sessions
+_provider_stats = {provider: deque(maxlen=PROVIDER_STATS_WINDOW) for provider in PROVIDER_API_KEYS}
+_stats_lock = threading.Lock()
+
+# Workers that open provider streams (primary and hedged requests)
+_executor = ThreadPoolExecutor(max_workers=ROUTER_MAX_WORKERS, thread_name_prefix="router")
+
+
+def get_available_providers():
+    """
+    List providers that have an API key configured
+    
+    Returns:
+        list: Provider names
+    """
+    return [provider for provider, api_key in PROVIDER_API_KEYS.items() if api_key]
+
+
+def record_provider_result(provider, latency, success):
+    """
+    Record the outcome of a provider call
+    
+    Args:
+        provider (str): Provider name
+        latency (float): Time to first token in seconds
+        success (bool): Whether the call succeeded
+    """
+    with _stats_lock:
+        _provider_stats.setdefault(provider, deque(maxlen=PROVIDER_STATS_WINDOW)).append((latency, success))
+
+
+def get_provider_stats(provider):
+    """
+    Summarize a provider's recent latency and error rate
+    
+    Args:
+        provider (str): Provider name
+    
+    Returns:
+        dict: {"samples", "error_rate", "p95"} (p95 is None without successful samples)
+    """
+    with _stats_lock:
+        samples = list(_provider_stats.get(provider, []))
+    
+    if not samples:
+        return {"samples": 0, "error_rate": 0.0, "p95": None}
+    
+    latencies = sorted(latency for latency, success in samples if success)
+    p95 = None
+    if latencies:
+        p95 = latencies[min(len(latencies) - 1, int(PROVIDER_HEDGE_PERCENTILE * len(latencies)))]
+    
+    failures = sum(1 for latency, success in samples if not success)
+    return {"samples": len(samples), "error_rate": failures / len(samples), "p95": p95}
+
+
+def _is_unhealthy(stats):
+    return stats["samples"] >= PROVIDER_MIN_SAMPLES and stats["error_rate"] > PROVIDER_ERROR_RATE_THRESHOLD
+
+
+def rank_providers(preferred_provider):
+    """
+    Order configured providers for a request
+    
+    The preferred provider goes first unless its recent error rate is above
+    PROVIDER_ERROR_RATE_THRESHOLD; the others follow, healthiest and fastest
+    first.
+    
+    Args:
+        preferred_provider (str): Provider chosen by the user
+    
+    Returns:
+        list: Provider names in the order they should be tried
+    """
+    preferred_provider = preferred_provider.lower()
+    candidates = get_available_providers()
+    if preferred_provider not in candidates:
+        candidates.insert(0, preferred_provider)
+    
+    stats = {provider: get_provider_stats(provider) for provider in candidates}
+    
+    def sort_key(provider):
+        provider_stats = stats[provider]
+        p95 = provider_stats["p95"] if provider_stats["p95"] is not None else float("inf")
+        return (
+            _is_unhealthy(provider_stats),
+            provider != preferred_provider,
+            provider_stats["error_rate"],
+            p95
+        )
+    
+    return sorted(candidates, key=sort_key)
+
+
+def _get_hedge_delay(provider):
+    """Seconds to wait for a first token before hedging, or None if stats are too thin"""
+    stats = get_provider_stats(provider)
+    if stats["samples"] < PROVIDER_MIN_SAMPLES or stats["p95"] is None:
+        return None
+    return max(PROVIDER_HEDGE_MIN_DELAY_SECONDS, stats["p95"])
+
+
+def _open_stream(provider, messages, temperature, max_tokens):
+    """Start streaming from a provider and wait for its first chunk"""
+    started = time.monotonic()
+    try:
+        chat_model = get_chat_model(provider=provider, temperature=temperature, max_tokens=max_tokens)
+        iterator = iter(chat_model.stream(messages))
+        first_chunk = next(iterator, None)
+    except Exception:
+        record_provider_result(provider, time.monotonic() - started, False)
+        raise
+    
+    record_provider_result(provider, time.monotonic() - started, True)
+    return iterator, first_chunk
+
+
+def _close_stream(future):
+    """Close the stream of a request that lost a hedge race"""
+    if future.exception() is None:
+        iterator, first_chunk = future.result()
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            close()
+
+
+def stream_with_fallback(messages, preferred_provider="gemini", temperature=0.7, max_tokens=None, route_info=None):
+    """
+    Stream a chat response, failing over and hedging across providers
+    
+    Providers are tried in rank_providers order. If a provider fails before
+    its first token, the next one is tried. With hedging enabled, a second
+    provider is started when the current one has not produced a first token
+    within its recent p95 latency, and whichever answers first is used.
+    
+    Args:
+        messages (list): LangChain messages
+        preferred_provider (str): Provider chosen by the user
+        temperature (float): Sampling temperature
+        max_tokens (int): Maximum tokens in response
+        route_info (dict): Optional dict that receives the serving "provider"
+    
+    Yields:
+        str: Text chunks of the response
+    
+    Raises:
+        RuntimeError: If every provider fails
+    """
+    candidates = rank_providers(preferred_provider) if PROVIDER_FALLBACK_ENABLED else [preferred_provider.lower()]
+    errors = []
+    
+    while candidates:
+        provider = candidates.pop(0)
+        futures = {_executor.submit(_open_stream, provider, messages, temperature, max_tokens): provider}
+        
+        hedge_delay = _get_hedge_delay(provider) if PROVIDER_HEDGING_ENABLED and candidates else None
+        if hedge_delay is not None:
+            done, _ = wait(list(futures), timeout=hedge_delay)
+            if not done:
+                hedge_provider = candidates.pop(0)
+                futures[_executor.submit(_open_stream, hedge_provider, messages, temperature, max_tokens)] = hedge_provider
+        
+        winner = None
+        pending = set(futures)
+        while pending and winner is None:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    errors.append(f"{futures[future]}: {future.exception()}")
+                elif winner is None:
+                    winner = future
+                else:
+                    _close_stream(future)
+        
+        if winner is None:
+            continue
+        
+        for future in pending:
+            future.add_done_callback(_close_stream)
+        
+        serving_provider = futures[winner]
+        if route_info is not None:
+            route_info["provider"] = serving_provider
+        
+        iterator, first_chunk = winner.result()
+        if first_chunk is not None and first_chunk.content:
+            yield first_chunk.content
+        for chunk in iterator:
+            if chunk.content:
+                yield chunk.content
+        return
+    
+    raise RuntimeError(f"All providers failed: {'; '.join(errors)}")
+
+
+def get_routed_response(messages, preferred_provider="gemini", temperature=0.7, max_tokens=None):
+    """
+    Get a complete chat response with provider failover and hedging
+    
+    Args:
+        messages (list): LangChain messages
+        preferred_provider (str): Provider chosen by the user
+        temperature (float): Sampling temperature
+        max_tokens (int): Maximum tokens in response
+    
+    Returns:
+        tuple: (response text, provider that served it)
+    
+    Raises:
+        RuntimeError: If every provider fails
+    """
+    route_info = {}
+    response = "".join(stream_with_fallback(messages, preferred_provider, temperature, max_tokens, route_info))
+    return response, route_info.get("provider")
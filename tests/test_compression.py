@@ -0,0 +1,41 @@
+from langchain_core.documents import Document
+
+from utils.rag_utils import _text_overlap, compress_docs
+from utils.text_splitter import TokenTextSplitter
+
+
+def test_short_block_overlap_is_detected():
+    first = "Long paragraph about sorting.\n\nShort note 6."
+    second = "Short note 6.\n\nNext paragraph."
+    
+    assert _text_overlap(first, second) == len("Short note 6.")
+
+
+def test_shared_word_inside_block_is_not_an_overlap():
+    assert _text_overlap("The answer is yes.", "yes. Another topic entirely.") == 0
+
+
+def test_long_overlap_inside_block_is_detected():
+    shared = "x" * 80
+    
+    assert _text_overlap("prefix " + shared, shared + " suffix") == len(shared)
+
+
+def test_adjacent_chunks_merge_without_duplicated_overlap():
+    text = "\n\n".join(
+        f"Paragraph {i} " + " ".join(f"detail{i}_{n}" for n in range(40)) + f".\n\nShort note {i}."
+        for i in range(12)
+    )
+    chunks = TokenTextSplitter(256, 32).split_documents(
+        [Document(page_content=text, metadata={"source": "notes.md"})]
+    )
+    assert len(chunks) > 1
+    # Leave only the text overlap to tell the merge that the chunks touch
+    for chunk in chunks:
+        del chunk.metadata["chunk_index"]
+    
+    merged = compress_docs("detail", chunks, token_budget=10000, max_docs=len(chunks))
+    
+    assert len(merged) == 1
+    for i in range(12):
+        assert merged[0].page_content.count(f"Short note {i}.") == 1
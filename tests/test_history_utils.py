@@ -0,0 +1,52 @@
+from utils import history_utils
+from utils.history_utils import new_history_state, prepare_history
+
+
+def make_messages(count, words=50):
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": " ".join(f"turn{i}_{n}" for n in range(words))}
+        for i in range(count)
+    ]
+
+
+def test_short_history_is_replayed_whole():
+    messages = make_messages(4)
+    state = new_history_state()
+    
+    summary, recent = prepare_history(messages, state, "gemini", token_budget=1000, keep_tokens=200)
+    
+    assert summary == ""
+    assert recent == messages
+
+
+def test_overflow_folds_older_turns_into_summary(monkeypatch):
+    monkeypatch.setattr(history_utils, "summarize_messages", lambda provider, msgs, previous: f"{len(msgs)} turns")
+    messages = make_messages(10)
+    state = new_history_state()
+    
+    summary, recent = prepare_history(messages, state, "gemini", token_budget=300, keep_tokens=150)
+    
+    folded = len(messages) - len(recent)
+    assert summary == f"{folded} turns"
+    assert state["summarized_count"] == folded
+    assert recent == messages[folded:]
+
+
+def test_failed_summary_keeps_turns_for_next_fold(monkeypatch):
+    def fail(provider, msgs, previous):
+        raise RuntimeError("Failed to summarize conversation: provider down")
+    
+    monkeypatch.setattr(history_utils, "summarize_messages", fail)
+    messages = make_messages(10)
+    state = new_history_state()
+    
+    summary, recent = prepare_history(messages, state, "gemini", token_budget=300, keep_tokens=150)
+    
+    assert summary == ""
+    assert state["summarized_count"] == 0
+    assert len(recent) < len(messages)
+    
+    monkeypatch.setattr(history_utils, "summarize_messages", lambda provider, msgs, previous: f"{len(msgs)} turns")
+    summary, recent = prepare_history(messages, state, "gemini", token_budget=300, keep_tokens=150)
+    
+    assert summary == f"{len(messages) - len(recent)} turns"
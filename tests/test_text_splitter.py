@@ -0,0 +1,90 @@
+from langchain_core.documents import Document
+
+from utils.text_splitter import TokenTextSplitter
+from utils.token_utils import count_tokens
+
+
+def make_paragraph(index, words=20):
+    return " ".join(f"word{index}_{n}" for n in range(words)) + "."
+
+
+def test_small_sections_share_a_chunk():
+    text = "\n\n".join(f"## Section {i}\n\nShort note {i}." for i in range(5))
+    chunks = TokenTextSplitter(256, 32).split_text(text)
+    
+    assert len(chunks) == 1
+    assert chunks[0][1] == "Section 0"
+    assert "Short note 4." in chunks[0][0]
+
+
+def test_chunks_respect_token_budget():
+    text = "\n\n".join(make_paragraph(i) for i in range(40))
+    chunks = TokenTextSplitter(100, 20).split_text(text)
+    
+    assert len(chunks) > 1
+    for chunk_text, _, tokens in chunks:
+        assert tokens <= 100
+        assert count_tokens(chunk_text) <= 110
+
+
+def test_overlap_repeats_trailing_paragraph():
+    text = "\n\n".join(make_paragraph(i, words=8) for i in range(30))
+    splitter = TokenTextSplitter(60, 30)
+    chunks = splitter.split_text(text)
+    
+    assert len(chunks) > 1
+    for (first, _, _), (second, _, _) in zip(chunks, chunks[1:]):
+        first_blocks = first.split("\n\n")
+        second_blocks = second.split("\n\n")
+        carried = [block for block in second_blocks if block in first_blocks]
+        assert carried and carried == first_blocks[-len(carried):]
+        assert count_tokens("\n\n".join(carried)) <= 30 + len(carried)
+
+
+def test_heading_is_never_left_at_chunk_end():
+    sections = [f"## Part {i}\n\n" + "\n\n".join(make_paragraph(i * 10 + j) for j in range(3)) for i in range(6)]
+    chunks = TokenTextSplitter(80, 10).split_text("\n\n".join(sections))
+    
+    for chunk_text, section, _ in chunks:
+        assert not chunk_text.split("\n\n")[-1].startswith("#")
+        if chunk_text.startswith("## Part"):
+            assert section.split(" > ")[-1] == chunk_text.split("\n")[0][3:]
+
+
+def test_code_fence_comments_are_not_headings():
+    text = "# Guide\n\n```python\n# not a heading\nx = 1\n```\n\nAfter the code."
+    chunks = TokenTextSplitter(256, 32).split_text(text)
+    
+    assert len(chunks) == 1
+    assert chunks[0][1] == "Guide"
+    assert "# not a heading" in chunks[0][0]
+
+
+def test_oversized_block_is_split():
+    text = " ".join(f"token{n}" for n in range(500))
+    chunks = TokenTextSplitter(50, 10).split_text(text)
+    
+    assert len(chunks) > 1
+    assert all(tokens <= 50 for _, _, tokens in chunks)
+
+
+def test_heading_carried_ahead_of_oversized_block_fits():
+    text = "Intro.\n\n## Heading one\n\n" + " ".join(f"word{n}" for n in range(300))
+    chunks = TokenTextSplitter(50, 10).split_text(text)
+    
+    assert chunks[1][0].startswith("## Heading one\n\nword0 ")
+    assert all(tokens <= 50 for _, _, tokens in chunks)
+
+
+def test_split_documents_keeps_metadata_and_pages_apart():
+    pages = [
+        Document(page_content="\n\n".join(make_paragraph(p * 10 + i) for i in range(4)), metadata={"source": "a.pdf", "page": p})
+        for p in range(2)
+    ]
+    chunks = TokenTextSplitter(60, 10).split_documents(pages)
+    
+    for page in range(2):
+        page_chunks = [chunk for chunk in chunks if chunk.metadata["page"] == page]
+        assert [chunk.metadata["chunk_index"] for chunk in page_chunks] == list(range(len(page_chunks)))
+        assert all(f"word{(1 - page) * 10}_" not in chunk.page_content for chunk in page_chunks)
+        assert all(chunk.metadata["source"] == "a.pdf" for chunk in page_chunks)
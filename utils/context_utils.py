@@ -0,0 +1,140 @@
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+# Add parent directory to path for imports
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+from models.llm import get_vision_response
+from utils.rag_utils import retrieve_relevant_docs, compress_docs, format_docs_for_context
+from utils.web_search import get_search_context
+from utils.image_utils import get_cached_image_analysis, store_image_analysis
+from config.config import (
+    CONTEXT_MAX_WORKERS,
+    RAG_TIMEOUT_SECONDS,
+    WEB_SEARCH_TIMEOUT_SECONDS,
+    IMAGE_ANALYSIS_TIMEOUT_SECONDS,
+    IMAGE_ANALYSIS_PROMPT,
+    DEFAULT_LLM_MODEL,
+    MAX_RETRIEVED_DOCS,
+    RERANKER_MODEL,
+    RERANK_CANDIDATES
+)
+
+# Shared worker pool for context sources; created once per process
+_executor = ThreadPoolExecutor(max_workers=CONTEXT_MAX_WORKERS, thread_name_prefix="context")
+
+
+def _retrieve_rag_context(query, vector_store, doc_ids=None):
+    """Retrieve, compress and format document context for a query"""
+    k = RERANK_CANDIDATES if RERANKER_MODEL else MAX_RETRIEVED_DOCS
+    relevant_docs = retrieve_relevant_docs(query, vector_store, k=k, doc_ids=doc_ids)
+    return format_docs_for_context(compress_docs(query, relevant_docs))
+
+
+def _retrieve_web_context(query, deadline=None):
+    """Retrieve formatted web search context, raising on unavailable search"""
+    web_results = get_search_context(query, deadline=deadline)
+    if web_results.startswith("Web search unavailable"):
+        raise RuntimeError(web_results)
+    if web_results == "No search results found.":
+        return ""
+    return web_results
+
+
+def _analyze_image(image_url, image_hash=None, perceptual_hash=None):
+    """Describe an image, reusing a cached description of the same image"""
+    analysis = get_cached_image_analysis(image_hash, IMAGE_ANALYSIS_PROMPT, DEFAULT_LLM_MODEL, perceptual_hash)
+    if analysis is None:
+        analysis = get_vision_response(image_url, IMAGE_ANALYSIS_PROMPT, model_name=DEFAULT_LLM_MODEL)
+        store_image_analysis(image_hash, IMAGE_ANALYSIS_PROMPT, DEFAULT_LLM_MODEL, analysis, perceptual_hash)
+    return analysis
+
+
+def gather_context(query, vector_store=None, use_web_search=False, image_url=None, timeouts=None, doc_ids=None,
+                   image_hash=None, image_perceptual_hash=None):
+    """
+    Gather RAG, web search and image analysis context concurrently
+    
+    All enabled sources are started at once on a shared thread pool, so the
+    total wait is roughly the slowest source rather than the sum. A source
+    that fails or exceeds its timeout is reported in "errors" and the other
+    results are still returned.
+    
+    This function does not touch st.session_state, so it is safe to call
+    from worker threads and outside Streamlit.
+    
+    Args:
+        query (str): Current user query
+        vector_store: Vector store to retrieve from, or None to skip RAG
+        use_web_search (bool): Whether to run a web search
+        image_url (str): Optional image data URL to analyze
+        timeouts (dict): Optional per-source timeouts in seconds ("rag", "web", "image")
+        doc_ids (list): Optional document ids to restrict RAG retrieval to
+        image_hash (str): Optional content hash of the image, used to reuse cached descriptions
+        image_perceptual_hash (str): Optional perceptual hash, for the opt-in near-duplicate cache tier
+    
+    Returns:
+        dict: {"rag_context", "web_context", "image_analysis", "errors"}
+    """
+    source_timeouts = {
+        "rag": RAG_TIMEOUT_SECONDS,
+        "web": WEB_SEARCH_TIMEOUT_SECONDS,
+        "image": IMAGE_ANALYSIS_TIMEOUT_SECONDS
+    }
+    if timeouts:
+        source_timeouts.update(timeouts)
+    
+    context = {
+        "rag_context": "",
+        "web_context": "",
+        "image_analysis": "",
+        "errors": {}
+    }
+    
+    started = time.monotonic()
+    
+    futures = {}
+    if vector_store is not None:
+        futures["rag"] = _executor.submit(_retrieve_rag_context, query, vector_store, doc_ids)
+    if use_web_search:
+        # Search retries and backoff must finish inside the web source's budget
+        futures["web"] = _executor.submit(_retrieve_web_context, query, started + source_timeouts["web"])
+    if image_url:
+        futures["image"] = _executor.submit(_analyze_image, image_url, image_hash, image_perceptual_hash)
+    
+    result_keys = {"rag": "rag_context", "web": "web_context", "image": "image_analysis"}
+    
+    for source, future in futures.items():
+        # Every source's timeout is measured from the common start time
+        remaining = max(0.0, source_timeouts[source] - (time.monotonic() - started))
+        try:
+            context[result_keys[source]] = future.result(timeout=remaining) or ""
+        except FutureTimeoutError:
+            # The worker keeps running in the background; its result is discarded
+            context["errors"][source] = f"timed out after {source_timeouts[source]}s"
+        except Exception as e:
+            context["errors"][source] = str(e)
+    
+    return context
+
+
+def build_additional_context(context):
+    """
+    Format gathered RAG and web search results into a prompt context block
+    
+    Args:
+        context (dict): Result of gather_context
+    
+    Returns:
+        str: Combined context string (empty if nothing was retrieved)
+    """
+    additional_context = ""
+    if context.get("rag_context"):
+        additional_context += "\n\n**Context from uploaded documents:**\n" + context["rag_context"]
+    if context.get("web_context"):
+        additional_context += "\n\n**Recent information from web search:**\n" + context["web_context"]
+    return additional_context
@@ -0,0 +1,153 @@
+import os
+import sys
+
+from langchain_core.messages import SystemMessage, HumanMessage
+
+# Add parent directory to path for imports
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+from models.router import get_routed_response
+from utils.token_utils import count_tokens
+from config.config import (
+    HISTORY_TOKEN_BUDGET,
+    HISTORY_KEEP_TOKENS,
+    HISTORY_SUMMARY_MAX_TOKENS,
+    HISTORY_SUMMARY_PROMPT
+)
+
+# Per-message overhead for role markers and separators
+MESSAGE_TOKEN_OVERHEAD = 4
+
+
+def new_history_state():
+    """
+    Create an empty rolling-summary state for a conversation
+
+    Returns:
+        dict: {"summary": str, "summarized_count": int}
+    """
+    return {"summary": "", "summarized_count": 0}
+
+
+def get_message_tokens(message):
+    """
+    Get the token count of a chat message, computing it only once
+
+    The count is cached on the message dict under "tokens".
+
+    Args:
+        message (dict): Chat message with "role" and "content"
+
+    Returns:
+        int: Number of tokens in the message
+    """
+    if "tokens" not in message:
+        message["tokens"] = count_tokens(message.get("content", "")) + MESSAGE_TOKEN_OVERHEAD
+    return message["tokens"]
+
+
+def select_recent_messages(messages, token_budget):
+    """
+    Select the newest messages that fit within a token budget
+
+    Args:
+        messages (list): Chat messages, oldest first
+        token_budget (int): Maximum total tokens
+
+    Returns:
+        int: Index of the first message to keep
+    """
+    total = 0
+    start = len(messages)
+    for index in range(len(messages) - 1, -1, -1):
+        total += get_message_tokens(messages[index])
+        if total > token_budget:
+            break
+        start = index
+    return start
+
+
+def summarize_messages(provider, messages, previous_summary=""):
+    """
+    Fold conversation turns into a rolling summary
+
+    The request goes through the provider router, so it fails over like
+    chat answers do when the preferred provider is down or has no key.
+
+    Args:
+        provider (str): Preferred provider for the summary model
+        messages (list): Chat messages to fold in, oldest first
+        previous_summary (str): Existing summary to extend
+
+    Returns:
+        str: Updated summary
+
+    Raises:
+        RuntimeError: If summarization fails
+    """
+    try:
+        transcript = "\n".join(
+            f"{'Student' if msg['role'] == 'user' else 'Assistant'}: {msg['content']}"
+            for msg in messages
+        )
+        request = (
+            f"Existing summary:\n{previous_summary or '(none)'}\n\n"
+            f"New conversation turns:\n{transcript}\n\n"
+            "Updated summary:"
+        )
+        response, _ = get_routed_response(
+            [SystemMessage(content=HISTORY_SUMMARY_PROMPT), HumanMessage(content=request)],
+            preferred_provider=provider,
+            temperature=0.2,
+            max_tokens=HISTORY_SUMMARY_MAX_TOKENS
+        )
+        return response.strip()
+
+    except Exception as e:
+        raise RuntimeError(f"Failed to summarize conversation: {str(e)}")
+
+
+def prepare_history(messages, history_state, summary_provider, token_budget=HISTORY_TOKEN_BUDGET,
+                    keep_tokens=HISTORY_KEEP_TOKENS):
+    """
+    Bound the conversation history replayed to the model
+
+    Turns after the summarized prefix are replayed as long as they fit in
+    token_budget. Once they overflow, everything except the newest
+    keep_tokens worth of turns is folded into the rolling summary. Folding
+    in batches means the summary model is only called occasionally, not on
+    every turn. If the summary cannot be written, the state is left as it
+    was and the fold is retried on the next turn.
+
+    Args:
+        messages (list): Prior chat messages (excluding the current query), oldest first
+        history_state (dict): Rolling-summary state from new_history_state, updated in place
+        summary_provider (str): Preferred provider for the summary model
+        token_budget (int): Maximum tokens of unsummarized history
+        keep_tokens (int): Tokens of newest history kept verbatim after folding
+
+    Returns:
+        tuple: (summary string, list of recent messages to replay)
+    """
+    # History was cleared or replaced since the last fold
+    if history_state["summarized_count"] > len(messages):
+        history_state.update(new_history_state())
+
+    pending = messages[history_state["summarized_count"]:]
+    if sum(get_message_tokens(msg) for msg in pending) <= token_budget:
+        return history_state["summary"], pending
+
+    keep_from = select_recent_messages(pending, keep_tokens)
+    to_fold = pending[:keep_from]
+
+    try:
+        history_state["summary"] = summarize_messages(summary_provider, to_fold, history_state["summary"])
+    except Exception:
+        # Leave the older turns unsummarized so the next turn folds them again;
+        # only this turn's replay is trimmed
+        return history_state["summary"], pending[keep_from:]
+
+    history_state["summarized_count"] += len(to_fold)
+    return history_state["summary"], pending[keep_from:]
@@ -1,43 +1,98 @@
 import os
 import sys
-from PIL import Image
+from PIL import Image, ImageOps
 import io
+import time
 import base64
+import sqlite3
+import hashlib
+import threading
 
 # Add parent directory to path for imports
 current_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(current_dir)
 sys.path.insert(0, parent_dir)
 
+from config.config import (
+    IMAGE_MAX_DIMENSIONS,
+    IMAGE_TARGET_BYTES,
+    IMAGE_QUALITY_STEPS,
+    IMAGE_BLOB_DIRECTORY,
+    IMAGE_BLOB_MAX_BYTES,
+    IMAGE_THUMBNAIL_SIZE,
+    HISTORY_IMAGE_MAX_BYTES,
+    IMAGE_ANALYSIS_CACHE_ENABLED,
+    IMAGE_ANALYSIS_CACHE_PATH,
+    IMAGE_ANALYSIS_CACHE_MAX_ENTRIES,
+    IMAGE_HASH_FUZZY_MATCH,
+    IMAGE_HASH_SIZE,
+    IMAGE_HASH_MAX_DISTANCE
+)
 
-def process_image(uploaded_file):
+# Shared SQLite connection for the image analysis cache
+_analysis_cache_connection = None
+_analysis_cache_lock = threading.Lock()
+
+# Bytes of image blobs on disk per blob directory, counted once and then kept up to date
+_blob_bytes = {}
+_blob_lock = threading.Lock()
+
+# Fraction of IMAGE_BLOB_MAX_BYTES kept after an eviction, so evictions are rare
+BLOB_EVICTION_TARGET_RATIO = 0.9
+
+# MIME types for the formats images are saved in
+IMAGE_MIME_TYPES = {
+    "PNG": "image/png",
+    "JPEG": "image/jpeg",
+    "WEBP": "image/webp",
+    "GIF": "image/gif"
+}
+
+
+def process_image(uploaded_file, max_size=IMAGE_MAX_DIMENSIONS):
     """
     Process uploaded image file and prepare for LLM
     
+    The image is decoded straight from the upload buffer. For JPEGs,
+    Image.draft lets the decoder downscale by a power of two during decoding,
+    so large photos are never fully decoded at their original resolution.
+    EXIF orientation is applied and metadata is dropped.
+    
     Args:
         uploaded_file: Streamlit uploaded file object
+        max_size: Tuple of (max_width, max_height) the image will be resized to
     
     Returns:
-        tuple: (PIL Image object, bytes data)
+        tuple: (PIL Image object, original format name)
     
     Raises:
         Exception: If image processing fails
     """
     try:
-        # Read image bytes
-        image_bytes = uploaded_file.read()
+        # Open with PIL directly from the upload buffer
+        uploaded_file.seek(0)
+        image = Image.open(uploaded_file)
+        original_format = image.format
+        
+        # Reduced decoding for JPEGs: decode at the smallest scale still >= max_size
+        if original_format == "JPEG":
+            image.draft("RGB", max_size)
         
-        # Open with PIL
-        image = Image.open(io.BytesIO(image_bytes))
+        # Apply EXIF orientation before metadata is stripped
+        image = ImageOps.exif_transpose(image)
         
         # Convert to RGB if needed (for JPEG compatibility)
         if image.mode not in ('RGB', 'RGBA'):
-            image = image.convert('RGB')
+            has_alpha = image.mode in ('LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info)
+            image = image.convert('RGBA' if has_alpha else 'RGB')
+        
+        # Strip metadata (EXIF, ICC, text chunks) so it is not re-encoded into the payload
+        image.info = {}
         
         # Reset file pointer
         uploaded_file.seek(0)
         
-        return image, image_bytes
+        return image, original_format
     
     except Exception as e:
         raise Exception(f"Failed to process image: {str(e)}")
@@ -59,6 +114,388 @@ def encode_image_to_base64(image_bytes):
         raise Exception(f"Failed to encode image: {str(e)}")
 
 
+def build_image_data_url(image_bytes, mime_type):
+    """
+    Build a base64 data URL for sending an image to a vision model
+    
+    Args:
+        image_bytes: Image data in bytes
+        mime_type (str): MIME type matching the encoded format
+    
+    Returns:
+        str: data URL string
+    """
+    return f"data:{mime_type};base64,{encode_image_to_base64(image_bytes)}"
+
+
+def compute_perceptual_hash(image, hash_size=IMAGE_HASH_SIZE):
+    """
+    Compute a difference hash (dHash) of an image
+    
+    Visually similar images (re-saved, slightly rescaled or recompressed)
+    produce hashes that differ in only a few bits.
+    
+    Args:
+        image: PIL Image object
+        hash_size (int): Grid size; the hash has hash_size * hash_size bits
+    
+    Returns:
+        str: Hex-encoded hash
+    """
+    try:
+        grayscale = image.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.BILINEAR)
+        pixels = list(grayscale.getdata())
+        
+        value = 0
+        for row in range(hash_size):
+            offset = row * (hash_size + 1)
+            for col in range(hash_size):
+                value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+        
+        return f"{value:0{hash_size * hash_size // 4}x}"
+    except Exception as e:
+        raise Exception(f"Failed to hash image: {str(e)}")
+
+
+def _hash_distance(hash_a, hash_b):
+    """Number of differing bits between two hex hashes"""
+    return bin(int(hash_a, 16) ^ int(hash_b, 16)).count("1")
+
+
+def _get_analysis_cache():
+    """Open (once) the SQLite image analysis cache"""
+    global _analysis_cache_connection
+    if _analysis_cache_connection is None:
+        directory = os.path.dirname(IMAGE_ANALYSIS_CACHE_PATH)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        connection = sqlite3.connect(IMAGE_ANALYSIS_CACHE_PATH, check_same_thread=False)
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS image_descriptions ("
+            "content_hash TEXT NOT NULL, prompt_key TEXT NOT NULL, perceptual_hash TEXT, "
+            "analysis TEXT NOT NULL, last_access REAL NOT NULL, PRIMARY KEY (content_hash, prompt_key))"
+        )
+        connection.commit()
+        _analysis_cache_connection = connection
+    
+    return _analysis_cache_connection
+
+
+def _make_prompt_key(prompt, model_name):
+    return hashlib.sha256(f"{model_name}\0{prompt}".encode("utf-8")).hexdigest()
+
+
+def compute_content_hash(image_bytes):
+    """
+    Compute an exact hash of encoded image bytes
+    
+    Args:
+        image_bytes (bytes): Processed image bytes
+    
+    Returns:
+        str: Hex SHA-256 digest
+    """
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def get_cached_image_analysis(content_hash, prompt, model_name, perceptual_hash=None):
+    """
+    Look up a cached vision description for an image
+    
+    The exact content hash is tried first. Only when IMAGE_HASH_FUZZY_MATCH
+    is enabled is the description of a near-identical image (perceptual hash
+    within IMAGE_HASH_MAX_DISTANCE bits) reused.
+    
+    Args:
+        content_hash (str): Hash from compute_content_hash
+        prompt (str): Prompt the description was generated with
+        model_name (str): Vision model name
+        perceptual_hash (str): Optional hash from compute_perceptual_hash
+    
+    Returns:
+        str: Cached description, or None on a miss
+    """
+    if not IMAGE_ANALYSIS_CACHE_ENABLED or not content_hash:
+        return None
+    
+    try:
+        prompt_key = _make_prompt_key(prompt, model_name)
+        with _analysis_cache_lock:
+            connection = _get_analysis_cache()
+            row = connection.execute(
+                "SELECT content_hash, analysis FROM image_descriptions WHERE content_hash = ? AND prompt_key = ?",
+                (content_hash, prompt_key)
+            ).fetchone()
+            
+            if row is None and IMAGE_HASH_FUZZY_MATCH and perceptual_hash:
+                # The cache is size-bounded, so a linear scan for the closest hash is cheap
+                best = None
+                candidates = connection.execute(
+                    "SELECT content_hash, analysis, perceptual_hash FROM image_descriptions "
+                    "WHERE prompt_key = ? AND perceptual_hash IS NOT NULL",
+                    (prompt_key,)
+                ).fetchall()
+                for cached_content_hash, analysis, cached_hash in candidates:
+                    if len(cached_hash) != len(perceptual_hash):
+                        continue
+                    distance = _hash_distance(cached_hash, perceptual_hash)
+                    if distance <= IMAGE_HASH_MAX_DISTANCE and (best is None or distance < best[0]):
+                        best = (distance, cached_content_hash, analysis)
+                if best is not None:
+                    row = best[1:]
+            
+            if row is None:
+                return None
+            
+            connection.execute(
+                "UPDATE image_descriptions SET last_access = ? WHERE content_hash = ? AND prompt_key = ?",
+                (time.time(), row[0], prompt_key)
+            )
+            connection.commit()
+            return row[1]
+    except Exception:
+        return None
+
+
+def store_image_analysis(content_hash, prompt, model_name, analysis, perceptual_hash=None):
+    """
+    Cache a vision description, evicting the least recently used entries when full
+    
+    Args:
+        content_hash (str): Hash from compute_content_hash
+        prompt (str): Prompt the description was generated with
+        model_name (str): Vision model name
+        analysis (str): Vision model description
+        perceptual_hash (str): Optional hash from compute_perceptual_hash
+    """
+    if not IMAGE_ANALYSIS_CACHE_ENABLED or not content_hash or not analysis:
+        return
+    
+    try:
+        with _analysis_cache_lock:
+            connection = _get_analysis_cache()
+            connection.execute(
+                "INSERT OR REPLACE INTO image_descriptions "
+                "(content_hash, prompt_key, perceptual_hash, analysis, last_access) VALUES (?, ?, ?, ?, ?)",
+                (content_hash, _make_prompt_key(prompt, model_name), perceptual_hash, analysis, time.time())
+            )
+            count = connection.execute("SELECT COUNT(*) FROM image_descriptions").fetchone()[0]
+            if count > IMAGE_ANALYSIS_CACHE_MAX_ENTRIES:
+                connection.execute(
+                    "DELETE FROM image_descriptions WHERE rowid IN "
+                    "(SELECT rowid FROM image_descriptions ORDER BY last_access ASC LIMIT ?)",
+                    (count - IMAGE_ANALYSIS_CACHE_MAX_ENTRIES,)
+                )
+            connection.commit()
+    except Exception:
+        # Caching is best-effort; a failed write must not break the request
+        pass
+
+
+def create_thumbnail(image, max_size=IMAGE_THUMBNAIL_SIZE):
+    """
+    Create small encoded thumbnail bytes for chat history display
+    
+    Args:
+        image: PIL Image object
+        max_size: Tuple of (max_width, max_height)
+    
+    Returns:
+        bytes: JPEG (or WEBP for transparent images) thumbnail
+    """
+    try:
+        thumbnail = image.copy()
+        thumbnail.thumbnail(max_size, Image.Resampling.LANCZOS, reducing_gap=2.0)
+        
+        buffer = io.BytesIO()
+        if thumbnail.mode == 'RGBA':
+            thumbnail.save(buffer, format="WEBP", quality=70)
+        else:
+            thumbnail.convert('RGB').save(buffer, format="JPEG", quality=70, optimize=True)
+        return buffer.getvalue()
+    except Exception as e:
+        raise Exception(f"Failed to create thumbnail: {str(e)}")
+
+
+def _get_blob_path(blob_id, blob_directory=IMAGE_BLOB_DIRECTORY):
+    return os.path.join(blob_directory, blob_id[:2], blob_id)
+
+
+def _list_blobs(blob_directory):
+    """List (last used time, size, path) for every stored blob"""
+    blobs = []
+    for root, _, files in os.walk(blob_directory):
+        for file_name in files:
+            if file_name.endswith(".tmp"):
+                continue
+            path = os.path.join(root, file_name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            blobs.append((stat.st_mtime, stat.st_size, path))
+    return blobs
+
+
+def _evict_blobs(blob_directory, max_bytes):
+    """
+    Delete least recently used blobs until the directory fits the target size
+    
+    Returns:
+        int: Bytes of blobs left on disk
+    """
+    blobs = sorted(_list_blobs(blob_directory))
+    total = sum(size for _, size, _ in blobs)
+    target = int(max_bytes * BLOB_EVICTION_TARGET_RATIO)
+    for _, size, path in blobs:
+        if total <= target:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+    return total
+
+
+def save_image_blob(image_bytes, blob_directory=IMAGE_BLOB_DIRECTORY, max_bytes=IMAGE_BLOB_MAX_BYTES):
+    """
+    Store image bytes on disk under their content hash
+    
+    Identical images are stored once, whichever session uploads them. Once
+    the blobs take more than max_bytes, the least recently used ones are
+    deleted down to BLOB_EVICTION_TARGET_RATIO of the limit; history entries
+    whose blob is gone simply show no image.
+    
+    Args:
+        image_bytes: Encoded image bytes
+        blob_directory (str): Directory holding image blobs
+        max_bytes (int): Maximum total bytes of stored blobs
+    
+    Returns:
+        str: Blob id (SHA-256 of the bytes)
+    """
+    try:
+        blob_id = hashlib.sha256(image_bytes).hexdigest()
+        blob_path = _get_blob_path(blob_id, blob_directory)
+        
+        if os.path.exists(blob_path):
+            # Mark the blob as recently used
+            os.utime(blob_path)
+            return blob_id
+        
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        # Write to a temporary file first so readers never see a partial blob
+        temp_path = f"{blob_path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(image_bytes)
+        os.replace(temp_path, blob_path)
+        
+        with _blob_lock:
+            if blob_directory in _blob_bytes:
+                _blob_bytes[blob_directory] += len(image_bytes)
+            else:
+                _blob_bytes[blob_directory] = sum(size for _, size, _ in _list_blobs(blob_directory))
+            if _blob_bytes[blob_directory] > max_bytes:
+                _blob_bytes[blob_directory] = _evict_blobs(blob_directory, max_bytes)
+        
+        return blob_id
+    except Exception as e:
+        raise Exception(f"Failed to store image: {str(e)}")
+
+
+def load_image_blob(blob_id, blob_directory=IMAGE_BLOB_DIRECTORY):
+    """
+    Load image bytes stored by save_image_blob
+    
+    Args:
+        blob_id (str): Blob id
+        blob_directory (str): Directory holding image blobs
+    
+    Returns:
+        bytes: Image bytes, or None if the blob is missing
+    """
+    blob_path = _get_blob_path(blob_id, blob_directory)
+    try:
+        with open(blob_path, "rb") as f:
+            image_bytes = f.read()
+    except OSError:
+        return None
+    
+    try:
+        # Mark the blob as recently used
+        os.utime(blob_path)
+    except OSError:
+        pass
+    return image_bytes
+
+
+def make_history_image(image_data):
+    """
+    Build the compact image reference stored in a chat history message
+    
+    Args:
+        image_data (dict): Image payload from prepare_image_for_gemini
+    
+    Returns:
+        dict: {"blob_id": str or None, "thumbnail": bytes}
+    """
+    try:
+        blob_id = save_image_blob(image_data["bytes"])
+    except Exception:
+        # Without a blob the thumbnail is the only copy, so it can no longer be spilled to disk
+        blob_id = None
+    
+    return {
+        "blob_id": blob_id,
+        "thumbnail": image_data["thumbnail"]
+    }
+
+
+def get_history_image(image_ref):
+    """
+    Get displayable bytes for a history image reference
+    
+    Uses the in-memory thumbnail when present, otherwise loads the blob
+    from disk for this render only.
+    
+    Args:
+        image_ref (dict): Reference from make_history_image
+    
+    Returns:
+        bytes: Image bytes, or None if unavailable
+    """
+    if not image_ref:
+        return None
+    if image_ref.get("thumbnail") is not None:
+        return image_ref["thumbnail"]
+    if image_ref.get("blob_id"):
+        return load_image_blob(image_ref["blob_id"])
+    return None
+
+
+def enforce_history_image_budget(messages, max_bytes=HISTORY_IMAGE_MAX_BYTES):
+    """
+    Cap the thumbnail bytes a session keeps in memory
+    
+    Thumbnails are kept newest first until max_bytes is reached; older ones
+    are dropped from memory and fall back to the on-disk blob when displayed.
+    
+    Args:
+        messages (list): Chat messages, oldest first (updated in place)
+        max_bytes (int): Maximum total thumbnail bytes
+    """
+    total = 0
+    for message in reversed(messages):
+        image_ref = message.get("image")
+        if not isinstance(image_ref, dict) or image_ref.get("thumbnail") is None or not image_ref.get("blob_id"):
+            continue
+        total += len(image_ref["thumbnail"])
+        if total > max_bytes:
+            image_ref["thumbnail"] = None
+
+
 def get_image_info(image):
     """
     Get image metadata and information
@@ -95,12 +532,61 @@ def resize_image_if_needed(image, max_size=(1024, 1024)):
     """
     try:
         if image.width > max_size[0] or image.height > max_size[1]:
-            image.thumbnail(max_size, Image.Resampling.LANCZOS)
+            # reducing_gap does a fast box reduction first, then LANCZOS on the smaller image
+            image.thumbnail(max_size, Image.Resampling.LANCZOS, reducing_gap=2.0)
         return image
     except Exception as e:
         raise Exception(f"Failed to resize image: {str(e)}")
 
 
+def encode_image_for_upload(image, original_format=None, target_bytes=IMAGE_TARGET_BYTES):
+    """
+    Encode an image in a size-efficient format that fits a byte budget
+    
+    PNG uploads (typically screenshots) are kept lossless when they fit the
+    budget, since that keeps text crisp. Otherwise opaque images are encoded
+    as JPEG and images with transparency as WEBP, stepping down through
+    IMAGE_QUALITY_STEPS until the payload fits. If nothing fits, the
+    smallest attempt is returned.
+    
+    Args:
+        image: PIL Image object
+        original_format (str): Format of the uploaded file
+        target_bytes (int): Byte budget for the encoded image
+    
+    Returns:
+        tuple: (encoded bytes, format name)
+    """
+    try:
+        has_alpha = image.mode == 'RGBA'
+        smallest = None
+        
+        if original_format == "PNG":
+            buffer = io.BytesIO()
+            image.save(buffer, format="PNG", compress_level=6)
+            smallest = (buffer.getvalue(), "PNG")
+            if len(smallest[0]) <= target_bytes:
+                return smallest
+        
+        lossy_format = "WEBP" if has_alpha else "JPEG"
+        for quality in IMAGE_QUALITY_STEPS:
+            buffer = io.BytesIO()
+            if lossy_format == "JPEG":
+                image.save(buffer, format="JPEG", quality=quality, optimize=True)
+            else:
+                image.save(buffer, format="WEBP", quality=quality, method=4)
+            encoded = buffer.getvalue()
+            
+            if smallest is None or len(encoded) < len(smallest[0]):
+                smallest = (encoded, lossy_format)
+            if len(encoded) <= target_bytes:
+                return encoded, lossy_format
+        
+        return smallest
+    except Exception as e:
+        raise Exception(f"Failed to encode image: {str(e)}")
+
+
 def prepare_image_for_gemini(uploaded_file):
     """
     Prepare image for Gemini Vision API
@@ -109,26 +595,35 @@ def prepare_image_for_gemini(uploaded_file):
         uploaded_file: Streamlit uploaded file object
     
     Returns:
-        dict: Prepared image data with metadata
+        dict: Prepared image payload ("bytes", "mime_type", "data_url", ...) with metadata
     """
     try:
-        # Process image
-        image, image_bytes = process_image(uploaded_file)
+        # Process image (reduced decoding, orientation applied, metadata stripped)
+        image, original_format = process_image(uploaded_file)
         
         # Resize if too large
-        image = resize_image_if_needed(image)
+        image = resize_image_if_needed(image, IMAGE_MAX_DIMENSIONS)
+        
+        # Encode in a size-efficient format within the byte budget
+        final_bytes, save_format = encode_image_for_upload(image, original_format)
         
         # Get image info
         image_info = get_image_info(image)
+        image_info["format"] = save_format
+        image_info["original_format"] = original_format
+        image_info["bytes"] = len(final_bytes)
         
-        # Convert to bytes for API
-        img_byte_arr = io.BytesIO()
-        image.save(img_byte_arr, format=image.format or 'PNG')
-        final_bytes = img_byte_arr.getvalue()
+        # Encode once at upload time; the payload is reused for every request and for display
+        mime_type = IMAGE_MIME_TYPES.get(save_format, "image/png")
         
+        # The decoded image is not kept; only encoded bytes and a thumbnail live in the session
         return {
-            "image": image,
             "bytes": final_bytes,
+            "thumbnail": create_thumbnail(image),
+            "hash": compute_content_hash(final_bytes),
+            "perceptual_hash": compute_perceptual_hash(image) if IMAGE_HASH_FUZZY_MATCH else None,
+            "mime_type": mime_type,
+            "data_url": build_image_data_url(final_bytes, mime_type),
             "info": image_info,
             "filename": uploaded_file.name
         }
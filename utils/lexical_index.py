@@ -0,0 +1,216 @@
+import os
+import sys
+import re
+import math
+import threading
+from collections import Counter
+
+# Add parent directory to path for imports
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+from config.config import BM25_K1, BM25_B
+
+# Identifiers such as get_chat_model or embedding-001 are kept as single terms
+TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9_\-\.]*[a-z0-9]|[a-z0-9]")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from",
+    "how", "i", "in", "is", "it", "me", "of", "on", "or", "that", "the", "this", "to",
+    "was", "what", "when", "where", "which", "who", "why", "with", "you", "your"
+}
+
+# Process-wide lexical indexes, one per Chroma collection
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+# Chunks fetched per Chroma request while syncing an index
+SYNC_PAGE_SIZE = 1000
+
+
+def tokenize(text):
+    """
+    Split text into lowercase lexical terms, dropping common stopwords
+
+    Args:
+        text (str): Text to tokenize
+
+    Returns:
+        list: List of terms
+    """
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class LexicalIndex:
+    """
+    Compact in-memory BM25 inverted index over the chunks of one collection
+
+    Only term frequencies, chunk lengths and each chunk's doc_id are kept;
+    chunk text stays in Chroma and is fetched by id for the final results.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sync_lock = threading.Lock()  # Held while the index is (re)synced with its collection
+        self.postings = {}  # term -> {chunk_id: term frequency}
+        self.lengths = {}  # chunk_id -> number of terms
+        self.doc_ids = {}  # chunk_id -> doc_id
+        self.total_length = 0
+
+    def add(self, chunk_ids, texts, metadatas=None):
+        """Index chunks; chunks already in the index are skipped"""
+        metadatas = metadatas or [{}] * len(chunk_ids)
+        with self.lock:
+            for chunk_id, text, metadata in zip(chunk_ids, texts, metadatas):
+                if chunk_id in self.lengths:
+                    continue
+                terms = tokenize(text or "")
+                for term, frequency in Counter(terms).items():
+                    self.postings.setdefault(term, {})[chunk_id] = frequency
+                self.lengths[chunk_id] = len(terms)
+                self.doc_ids[chunk_id] = (metadata or {}).get("doc_id")
+                self.total_length += len(terms)
+
+    def remove(self, chunk_ids):
+        """Remove chunks from the index"""
+        with self.lock:
+            removed = set()
+            for chunk_id in chunk_ids:
+                if chunk_id in self.lengths:
+                    self.total_length -= self.lengths.pop(chunk_id)
+                    self.doc_ids.pop(chunk_id, None)
+                    removed.add(chunk_id)
+            if not removed:
+                return
+            for term in list(self.postings):
+                postings = self.postings[term]
+                for chunk_id in removed.intersection(postings):
+                    del postings[chunk_id]
+                if not postings:
+                    del self.postings[term]
+
+    def has_terms(self, query):
+        """
+        Check whether any term of a query occurs in the indexed chunks
+
+        Args:
+            query (str): Search query
+
+        Returns:
+            bool: True if at least one term matches, None if the query has no terms
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return None
+        with self.lock:
+            return any(term in self.postings for term in terms)
+
+    def search(self, query, k, doc_ids=None):
+        """
+        Score chunks against a query with BM25
+
+        Args:
+            query (str): Search query
+            k (int): Maximum number of results
+            doc_ids (list): Optional document ids to restrict results to
+
+        Returns:
+            list: (chunk_id, score) tuples, best first
+        """
+        allowed = set(doc_ids) if doc_ids else None
+        with self.lock:
+            count = len(self.lengths)
+            if not count:
+                return []
+            average_length = self.total_length / count or 1.0
+            scores = Counter()
+
+            for term in set(tokenize(query)):
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for chunk_id, frequency in postings.items():
+                    if allowed is not None and self.doc_ids.get(chunk_id) not in allowed:
+                        continue
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[chunk_id] / average_length)
+                    scores[chunk_id] += idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+
+        return scores.most_common(k)
+
+
+def get_collection_key(vector_store):
+    """Identify the Chroma collection behind a vector store"""
+    return vector_store._collection.name
+
+
+def _sync_index(index, vector_store):
+    """
+    Bring an index in line with the chunks currently stored in its collection
+
+    Only chunks the index is missing are fetched; chunks deleted from the
+    collection (e.g. by another process) are removed.
+    """
+    stored_ids = set()
+    offset = 0
+    while True:
+        page = vector_store.get(include=[], limit=SYNC_PAGE_SIZE, offset=offset)
+        ids = page.get("ids", [])
+        if not ids:
+            break
+        stored_ids.update(ids)
+        offset += len(ids)
+
+    with index.lock:
+        indexed_ids = set(index.lengths)
+    index.remove(list(indexed_ids - stored_ids))
+
+    missing_ids = list(stored_ids - indexed_ids)
+    for start in range(0, len(missing_ids), SYNC_PAGE_SIZE):
+        page = vector_store.get(ids=missing_ids[start:start + SYNC_PAGE_SIZE], include=["documents", "metadatas"])
+        index.add(page.get("ids", []), page.get("documents") or [], page.get("metadatas"))
+
+
+def get_lexical_index(vector_store, build=True):
+    """
+    Get the shared lexical index for a vector store's collection
+
+    On first use the index is built from the chunks already stored in the
+    collection; ingestion in this process keeps it up to date incrementally.
+    Whenever the collection's chunk count no longer matches the index (chunks
+    written by ingest.py or another worker), the index is synced again.
+    Building and syncing hold only the collection's own lock, so lookups on
+    other collections are not blocked.
+
+    Args:
+        vector_store: Chroma vector store
+        build (bool): Build and sync the index; if False, return the index as is
+
+    Returns:
+        LexicalIndex: The collection's index, or None if not built and build is False
+    """
+    key = get_collection_key(vector_store)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            if not build:
+                return None
+            index = LexicalIndex()
+            _indexes[key] = index
+
+    if not build:
+        return index
+
+    if vector_store._collection.count() != len(index.lengths):
+        with index.sync_lock:
+            # Another thread may have synced while we waited
+            if vector_store._collection.count() != len(index.lengths):
+                _sync_index(index, vector_store)
+    return index
+
+
+def drop_lexical_index(collection_name):
+    """Forget the lexical index of a collection (e.g. after the collection is deleted)"""
+    with _indexes_lock:
+        _indexes.pop(collection_name, None)
@@ -0,0 +1,174 @@
+import os
+import sys
+import re
+import math
+import threading
+
+# Add parent directory to path for imports
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+from utils.web_search import should_use_web_search
+from utils.lexical_index import get_collection_key, get_lexical_index
+from config.config import (
+    HYBRID_SEARCH_ENABLED,
+    QUERY_ROUTING_ENABLED,
+    QUERY_ROUTER_LEXICAL_CHECK,
+    QUERY_ROUTER_EMBEDDING_CHECK,
+    QUERY_ROUTER_MIN_SIMILARITY
+)
+
+# Greetings and acknowledgements that need neither documents nor search
+SMALL_TALK_PATTERN = re.compile(
+    r"^(?:hi|hello|hey|thanks|thank you|thx|ok|okay|cool|great|nice|bye|goodbye|"
+    r"good (?:morning|afternoon|evening|night)|how are you)(?: there| so much| a lot)?[\s!.?]*$"
+)
+
+# Phrases that point at the uploaded material
+DOCUMENT_REFERENCE_PATTERN = re.compile(
+    r"\b(?:documents?|docs?|notes|pdfs?|files?|uploaded|upload|textbook|chapters?|slides|"
+    r"lecture|syllabus|according to|in the text)\b"
+)
+
+# Collection centroids, keyed by (collection, chunk count) so they refresh when documents change
+_centroids = {}
+_centroids_lock = threading.Lock()
+
+
+def _get_collection_centroid(vector_store):
+    """
+    Get the mean embedding of every chunk in a collection
+    
+    Args:
+        vector_store: Chroma vector store
+    
+    Returns:
+        list: Centroid vector, or None if the collection is empty
+    """
+    collection_key = get_collection_key(vector_store)
+    key = (collection_key, vector_store._collection.count())
+    with _centroids_lock:
+        if key in _centroids:
+            return _centroids[key]
+    
+    centroid = None
+    count = 0
+    offset = 0
+    page_size = 1000
+    while True:
+        page = vector_store.get(include=["embeddings"], limit=page_size, offset=offset)
+        ids = page.get("ids", [])
+        if not ids:
+            break
+        for embedding in page["embeddings"]:
+            if centroid is None:
+                centroid = [0.0] * len(embedding)
+            for i, value in enumerate(embedding):
+                centroid[i] += float(value)
+        count += len(ids)
+        offset += len(ids)
+    
+    if centroid is not None:
+        centroid = [value / count for value in centroid]
+    
+    with _centroids_lock:
+        # Drop centroids of older versions of this collection
+        for stale_key in [k for k in _centroids if k[0] == collection_key]:
+            del _centroids[stale_key]
+        _centroids[key] = centroid
+    return centroid
+
+
+def _cosine_similarity(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+def is_on_topic(query, vector_store, min_similarity=QUERY_ROUTER_MIN_SIMILARITY):
+    """
+    Check whether a query is close to the documents in a collection
+    
+    The query embedding is compared with the centroid of the collection's
+    chunk embeddings. The query embedding goes through the same cached
+    embedding model retrieval uses, so it is not paid for twice.
+    
+    Args:
+        query (str): User query
+        vector_store: Chroma vector store
+        min_similarity (float): Cosine similarity below which the query is off-topic
+    
+    Returns:
+        bool: True if the query is on-topic (or the check could not be made)
+    """
+    try:
+        centroid = _get_collection_centroid(vector_store)
+        if centroid is None:
+            return False
+        query_embedding = vector_store.embeddings.embed_query(query)
+        return _cosine_similarity(query_embedding, centroid) >= min_similarity
+    except Exception:
+        # Retrieving is the safe default when the check itself fails
+        return True
+
+
+def has_lexical_match(query, vector_store):
+    """
+    Check whether any query term occurs in a collection's chunks
+    
+    Uses the BM25 index hybrid search already keeps for the collection, so
+    the check is a dictionary lookup per query term.
+    
+    Args:
+        query (str): User query
+        vector_store: Chroma vector store
+    
+    Returns:
+        bool: False only if the query has terms and none of them is indexed
+    """
+    try:
+        return get_lexical_index(vector_store).has_terms(query) is not False
+    except Exception:
+        # Retrieving is the safe default when the check itself fails
+        return True
+
+
+def route_query(query, vector_store=None, use_web_search=False,
+                lexical_check=QUERY_ROUTER_LEXICAL_CHECK and HYBRID_SEARCH_ENABLED,
+                embedding_check=QUERY_ROUTER_EMBEDDING_CHECK):
+    """
+    Decide which context sources are worth their latency for a query
+    
+    Small talk skips both retrieval and search. Web search runs when it is
+    switched on or the query asks for current information (whole-word
+    keywords). Retrieval runs when a knowledge base is available, unless no
+    query term occurs in any uploaded document or the optional embedding
+    check finds the query far from them; questions that name the documents
+    always retrieve.
+    
+    Args:
+        query (str): User query
+        vector_store: Vector store to retrieve from, or None if RAG is off
+        use_web_search (bool): Whether the user switched web search on
+        lexical_check (bool): Skip retrieval when the BM25 index has no query term
+        embedding_check (bool): Compare the query with the collection centroid
+    
+    Returns:
+        dict: {"use_rag": bool, "use_web_search": bool}
+    """
+    use_rag = vector_store is not None
+    if not QUERY_ROUTING_ENABLED:
+        return {"use_rag": use_rag, "use_web_search": use_web_search or should_use_web_search(query)}
+    
+    normalized = re.sub(r"\s+", " ", query.lower()).strip()
+    if SMALL_TALK_PATTERN.match(normalized):
+        return {"use_rag": False, "use_web_search": False}
+    
+    if use_rag and not DOCUMENT_REFERENCE_PATTERN.search(normalized):
+        if lexical_check:
+            use_rag = has_lexical_match(query, vector_store)
+        if use_rag and embedding_check:
+            use_rag = is_on_topic(query, vector_store)
+    
+    return {"use_rag": use_rag, "use_web_search": use_web_search or should_use_web_search(query)}
@@ -1,20 +1,62 @@
 import os
 import sys
+import time
+import random
+import re
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_community.document_loaders import PyPDFLoader, TextLoader, Docx2txtLoader
 from langchain_community.vectorstores import Chroma
 from langchain_core.documents import Document
+from pypdf import PdfReader
+import docx2txt
+import chromadb
 
 # Add parent directory to path for imports
 current_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(current_dir)
 sys.path.insert(0, parent_dir)
 
-from models.embeddings import get_embedding_model
-from config.config import CHUNK_SIZE, CHUNK_OVERLAP, MAX_RETRIEVED_DOCS, PERSIST_DIRECTORY
+from models.embeddings import get_embedding_model, get_reranker_model
+from utils.lexical_index import get_lexical_index, drop_lexical_index
+from utils.text_splitter import get_text_splitter
+from utils.token_utils import encode, decode, count_tokens
+from config.config import (
+    CHUNK_SIZE_TOKENS,
+    CHUNK_OVERLAP_TOKENS,
+    MAX_RETRIEVED_DOCS,
+    HYBRID_SEARCH_ENABLED,
+    HYBRID_VECTOR_K,
+    HYBRID_LEXICAL_K,
+    RRF_K,
+    RETRIEVAL_MODE,
+    RETRIEVAL_SCORE_THRESHOLD,
+    MMR_FETCH_K,
+    MMR_LAMBDA,
+    CONTEXT_TOKEN_BUDGET,
+    RERANKER_MODEL,
+    PERSIST_DIRECTORY,
+    EMBEDDING_PROVIDER,
+    DEFAULT_USER_ID,
+    DEFAULT_COURSE_ID,
+    INGEST_BATCH_SIZE,
+    INGEST_MAX_CONCURRENCY,
+    INGEST_MAX_RETRIES,
+    INGEST_BACKOFF_BASE_SECONDS,
+    INGEST_BACKOFF_MAX_SECONDS
+)
 
 
+# Process-wide Chroma client and vector store handles, opened lazily and shared across sessions
+_chroma_clients = {}
+_vector_stores = {}
+_chroma_lock = threading.Lock()
+
+# Shortest chunk overlap, in characters, accepted when it does not start on a block boundary
+MIN_TEXT_OVERLAP = 64
+
 def load_document(file_path):
     """
     Load a document based on its file extension
@@ -48,14 +90,67 @@ def load_document(file_path):
         raise RuntimeError(f"Failed to load document: {str(e)}")
 
 
-def split_documents(documents, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP):
+def load_document_pages(file_obj, file_name):
+    """
+    Lazily load a document from an in-memory buffer, one page at a time
+    
+    PDFs are parsed page by page with pypdf, so pages can be split and
+    embedded while the rest of the file is still unread. Text, Markdown and
+    DOCX files yield a single page.
+    
+    Args:
+        file_obj: Binary file-like object (e.g. a Streamlit upload)
+        file_name (str): Original file name, used for type detection and metadata
+    
+    Returns:
+        tuple: (number of pages, generator of Document objects)
+    
+    Raises:
+        ValueError: If file type is not supported
+        RuntimeError: If the document cannot be opened
+    """
+    try:
+        file_extension = os.path.splitext(file_name)[1].lower()
+        file_obj.seek(0)
+        
+        if file_extension == '.pdf':
+            reader = PdfReader(file_obj)
+            
+            def iter_pdf_pages():
+                for page_number, page in enumerate(reader.pages):
+                    yield Document(
+                        page_content=page.extract_text() or "",
+                        metadata={"source": file_name, "page": page_number}
+                    )
+            
+            return len(reader.pages), iter_pdf_pages()
+        
+        elif file_extension == '.txt' or file_extension == '.md':
+            text = file_obj.read().decode('utf-8')
+        elif file_extension == '.docx':
+            text = docx2txt.process(file_obj)
+        else:
+            raise ValueError(f"Unsupported file type: {file_extension}")
+        
+        return 1, iter([Document(page_content=text, metadata={"source": file_name})])
+    
+    except ValueError:
+        raise
+    except Exception as e:
+        raise RuntimeError(f"Failed to load document: {str(e)}")
+
+
+def split_documents(documents, chunk_size=CHUNK_SIZE_TOKENS, chunk_overlap=CHUNK_OVERLAP_TOKENS):
     """
     Split documents into smaller chunks for better retrieval
     
+    Chunks are sized in tokens and follow paragraph, Markdown heading and
+    page boundaries (see utils.text_splitter).
+    
     Args:
         documents (list): List of Document objects
-        chunk_size (int): Size of each chunk
-        chunk_overlap (int): Overlap between chunks
+        chunk_size (int): Maximum tokens per chunk
+        chunk_overlap (int): Maximum tokens shared by consecutive chunks
     
     Returns:
         list: List of chunked Document objects
@@ -64,13 +159,7 @@ def split_documents(documents, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLA
         RuntimeError: If splitting fails
     """
     try:
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
-            length_function=len,
-            separators=["\n\n", "\n", " ", ""]
-        )
-        
+        text_splitter = get_text_splitter(chunk_size, chunk_overlap)
         chunks = text_splitter.split_documents(documents)
         return chunks
     
@@ -78,42 +167,231 @@ def split_documents(documents, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLA
         raise RuntimeError(f"Failed to split documents: {str(e)}")
 
 
-def create_vector_store(documents, persist_directory=PERSIST_DIRECTORY):
+def compute_document_id(file_bytes):
+    """
+    Compute a stable document id from the raw file contents
+    
+    Args:
+        file_bytes (bytes): Uploaded file contents
+    
+    Returns:
+        str: Short hex digest identifying the document
+    """
+    return hashlib.sha256(file_bytes).hexdigest()[:16]
+
+
+def compute_chunk_id(document):
+    """
+    Compute a content-addressed id for a chunk
+    
+    The id is a SHA-256 hash of the chunk's document id (or source, if the
+    chunk has no document id) and text, so the same chunk from the same file
+    always maps to the same id across uploads.
+    
+    Args:
+        document: Document object
+    
+    Returns:
+        str: Hex digest identifying the chunk
+    """
+    source = str(document.metadata.get("doc_id") or document.metadata.get("source", ""))
+    digest = hashlib.sha256()
+    digest.update(source.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(document.page_content.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _is_retryable_error(error):
+    """Check whether an embedding error looks like a rate limit or transient failure"""
+    message = str(error).lower()
+    markers = ["429", "rate limit", "resource exhausted", "resourceexhausted", "quota", "503", "unavailable", "timeout", "timed out"]
+    return any(marker in message for marker in markers)
+
+
+class _Backoff:
+    """Backoff state shared by all batches of one ingestion run
+    
+    When any batch hits a rate limit, every worker pauses until the backoff
+    window has passed, so concurrency adapts to the provider's limits.
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pause_until = 0.0
+    
+    def wait(self):
+        delay = self.pause_until - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+    
+    def register_failure(self, attempt):
+        delay = min(INGEST_BACKOFF_MAX_SECONDS, INGEST_BACKOFF_BASE_SECONDS * (2 ** attempt))
+        delay += random.uniform(0, delay / 2)
+        with self.lock:
+            self.pause_until = max(self.pause_until, time.monotonic() + delay)
+
+
+def _add_batch_with_retry(vector_store, documents, ids, backoff):
+    """Embed and add one batch, retrying with exponential backoff on retryable errors"""
+    for attempt in range(INGEST_MAX_RETRIES + 1):
+        backoff.wait()
+        try:
+            vector_store.add_documents(documents=documents, ids=ids)
+            
+            # Keep the lexical index in step if it has already been built
+            lexical_index = get_lexical_index(vector_store, build=False)
+            if lexical_index is not None:
+                lexical_index.add(ids, [doc.page_content for doc in documents], [doc.metadata for doc in documents])
+            
+            return len(ids)
+        except Exception as e:
+            if attempt >= INGEST_MAX_RETRIES or not _is_retryable_error(e):
+                raise
+            backoff.register_failure(attempt)
+
+
+def add_documents_to_vector_store(vector_store, documents, batch_size=INGEST_BATCH_SIZE,
+                                  max_workers=INGEST_MAX_CONCURRENCY, progress_callback=None):
     """
-    Create a vector store from documents using embeddings
+    Add only chunks that are not already in the vector store
+    
+    Chunks are keyed by compute_chunk_id; chunks already present in the
+    collection (or repeated within this batch) are skipped, so they cost no
+    embedding calls. New chunks are embedded in batches of batch_size with at
+    most max_workers batches in flight, backing off exponentially when the
+    embedding provider rate-limits.
     
     Args:
+        vector_store: Chroma vector store
         documents (list): List of Document objects
-        persist_directory (str): Directory to persist the vector store
+        batch_size (int): Number of chunks embedded per request
+        max_workers (int): Maximum number of batches embedded concurrently
+        progress_callback (callable): Optional callback(done, total) invoked
+            from the calling thread as batches complete
     
     Returns:
-        Chroma: Vector store object
+        int: Number of new chunks embedded and added
     
     Raises:
-        RuntimeError: If vector store creation fails
+        RuntimeError: If adding documents fails
     """
     try:
-        embedding_model = get_embedding_model()
+        new_documents = {}
+        for doc in documents:
+            chunk_id = compute_chunk_id(doc)
+            if chunk_id not in new_documents:
+                doc.metadata["chunk_hash"] = chunk_id
+                new_documents[chunk_id] = doc
         
-        # Create vector store
-        vector_store = Chroma.from_documents(
-            documents=documents,
-            embedding=embedding_model,
-            persist_directory=persist_directory
-        )
+        if not new_documents:
+            return 0
+        
+        existing = vector_store.get(ids=list(new_documents.keys()), include=[])
+        for chunk_id in existing.get("ids", []):
+            new_documents.pop(chunk_id, None)
         
-        return vector_store
+        total = len(new_documents)
+        if progress_callback:
+            progress_callback(0, total)
+        if not total:
+            return 0
+        
+        ids = list(new_documents.keys())
+        docs = list(new_documents.values())
+        backoff = _Backoff()
+        done = 0
+        
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            futures = [
+                executor.submit(
+                    _add_batch_with_retry,
+                    vector_store,
+                    docs[start:start + batch_size],
+                    ids[start:start + batch_size],
+                    backoff
+                )
+                for start in range(0, total, batch_size)
+            ]
+            for future in as_completed(futures):
+                done += future.result()
+                if progress_callback:
+                    progress_callback(done, total)
+        
+        return total
     
     except Exception as e:
-        raise RuntimeError(f"Failed to create vector store: {str(e)}")
+        raise RuntimeError(f"Failed to add documents to vector store: {str(e)}")
 
 
-def load_vector_store(persist_directory=PERSIST_DIRECTORY):
+def get_collection_name(user_id=DEFAULT_USER_ID, course_id=DEFAULT_COURSE_ID, provider=EMBEDDING_PROVIDER):
+    """
+    Build the Chroma collection name for a user's course knowledge base
+    
+    The embedding provider is part of the name because vectors from different
+    providers have different dimensions and cannot share a collection.
+    
+    Args:
+        user_id (str): User identifier
+        course_id (str): Course identifier
+        provider (str): Embedding provider
+    
+    Returns:
+        str: Valid Chroma collection name
+    """
+    raw_name = f"kb_{user_id}_{course_id}_{provider}".lower()
+    name = re.sub(r"[^a-z0-9_-]+", "-", raw_name).strip("-_")
+    
+    # Chroma collection names are limited to 63 characters
+    if len(name) > 63:
+        suffix = hashlib.sha256(raw_name.encode("utf-8")).hexdigest()[:8]
+        name = f"{name[:54].rstrip('-_')}_{suffix}"
+    
+    return name
+
+
+def get_ingest_manifest_path(collection_name, persist_directory=PERSIST_DIRECTORY):
+    """
+    Path of the bulk-ingestion manifest (file name -> doc_id) for a collection
+    
+    Args:
+        collection_name (str): Collection name
+        persist_directory (str): Directory where vector stores are persisted
+    
+    Returns:
+        str: Manifest file path
+    """
+    return os.path.join(persist_directory, f"{collection_name}_manifest.json")
+
+
+def get_chroma_client(persist_directory=PERSIST_DIRECTORY):
+    """
+    Get the process-wide persistent Chroma client for a directory
+    
+    The client is opened on first use and then shared by every session.
+    
+    Args:
+        persist_directory (str): Directory where vector stores are persisted
+    
+    Returns:
+        chromadb.PersistentClient: Shared client handle
+    """
+    with _chroma_lock:
+        if persist_directory not in _chroma_clients:
+            _chroma_clients[persist_directory] = chromadb.PersistentClient(path=persist_directory)
+        return _chroma_clients[persist_directory]
+
+
+def load_vector_store(persist_directory=PERSIST_DIRECTORY, collection_name=None):
     """
     Load an existing vector store from disk
     
+    Vector store handles are cached per (directory, collection), so every
+    session working on the same collection shares one handle and client.
+    
     Args:
         persist_directory (str): Directory where vector store is persisted
+        collection_name (str): Collection to open (defaults to the default user/course)
     
     Returns:
         Chroma: Loaded vector store object
@@ -122,27 +400,305 @@ def load_vector_store(persist_directory=PERSIST_DIRECTORY):
         RuntimeError: If loading fails
     """
     try:
-        embedding_model = get_embedding_model()
+        collection_name = collection_name or get_collection_name()
+        key = (persist_directory, collection_name)
         
-        vector_store = Chroma(
-            persist_directory=persist_directory,
-            embedding_function=embedding_model
-        )
+        if key not in _vector_stores:
+            client = get_chroma_client(persist_directory)
+            embedding_model = get_embedding_model()
+            
+            vector_store = Chroma(
+                client=client,
+                collection_name=collection_name,
+                embedding_function=embedding_model
+            )
+            
+            with _chroma_lock:
+                _vector_stores.setdefault(key, vector_store)
         
-        return vector_store
+        return _vector_stores[key]
     
     except Exception as e:
         raise RuntimeError(f"Failed to load vector store: {str(e)}")
 
 
-def retrieve_relevant_docs(query, vector_store, k=MAX_RETRIEVED_DOCS):
+def open_knowledge_base(collection_name, persist_directory=PERSIST_DIRECTORY):
+    """
+    Attach to a persisted knowledge base collection if it has any documents
+    
+    Used at session start so previously ingested documents are available
+    without re-uploading or re-embedding them.
+    
+    Args:
+        collection_name (str): Collection to attach to
+        persist_directory (str): Directory where vector stores are persisted
+    
+    Returns:
+        tuple: (vector_store or None, list of documents from list_documents)
+    
+    Raises:
+        RuntimeError: If the collection exists but cannot be opened
+    """
+    try:
+        if not os.path.isdir(persist_directory):
+            return None, []
+        
+        client = get_chroma_client(persist_directory)
+        try:
+            collection = client.get_collection(collection_name)
+        except Exception:
+            # Collection has never been created
+            return None, []
+        
+        if collection.count() == 0:
+            return None, []
+        
+        vector_store = load_vector_store(persist_directory, collection_name)
+        return vector_store, list_documents(vector_store)
+    
+    except Exception as e:
+        raise RuntimeError(f"Failed to open knowledge base: {str(e)}")
+
+
+def delete_knowledge_base(collection_name, persist_directory=PERSIST_DIRECTORY):
+    """
+    Delete a knowledge base collection and every chunk in it
+    
+    The collection is dropped from disk, along with its bulk-ingestion
+    manifest, and the shared vector store handle and lexical index for it are
+    forgotten, so the next upload starts from an empty collection.
+    
+    Args:
+        collection_name (str): Collection to delete
+        persist_directory (str): Directory where vector stores are persisted
+    
+    Raises:
+        RuntimeError: If deletion fails
+    """
+    try:
+        with _chroma_lock:
+            _vector_stores.pop((persist_directory, collection_name), None)
+        drop_lexical_index(collection_name)
+        
+        if not os.path.isdir(persist_directory):
+            return
+        
+        client = get_chroma_client(persist_directory)
+        if collection_name in [getattr(c, "name", c) for c in client.list_collections()]:
+            client.delete_collection(collection_name)
+        
+        manifest_path = get_ingest_manifest_path(collection_name, persist_directory)
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+    
+    except Exception as e:
+        raise RuntimeError(f"Failed to delete knowledge base: {str(e)}")
+
+
+def list_documents(vector_store):
+    """
+    List the documents stored in a knowledge base collection
+    
+    Args:
+        vector_store: Chroma vector store
+    
+    Returns:
+        list: Dicts with "doc_id", "name" and "chunks" for each document, in upload order
+    
+    Raises:
+        RuntimeError: If listing fails
+    """
+    try:
+        documents = {}
+        results = vector_store.get(include=["metadatas"])
+        
+        for metadata in results.get("metadatas") or []:
+            metadata = metadata or {}
+            doc_id = metadata.get("doc_id")
+            if not doc_id:
+                continue
+            if doc_id not in documents:
+                documents[doc_id] = {
+                    "doc_id": doc_id,
+                    "name": metadata.get("document_name", doc_id),
+                    "chunks": 0
+                }
+            documents[doc_id]["chunks"] += 1
+        
+        return list(documents.values())
+    
+    except Exception as e:
+        raise RuntimeError(f"Failed to list documents: {str(e)}")
+
+
+def remove_document(vector_store, doc_id):
+    """
+    Remove every chunk of a single document from the knowledge base
+    
+    Args:
+        vector_store: Chroma vector store
+        doc_id (str): Document id to remove
+    
+    Returns:
+        int: Number of chunks removed
+    
+    Raises:
+        RuntimeError: If removal fails
+    """
+    try:
+        results = vector_store.get(where={"doc_id": doc_id}, include=[])
+        ids = results.get("ids", [])
+        if ids:
+            vector_store.delete(ids=ids)
+            lexical_index = get_lexical_index(vector_store, build=False)
+            if lexical_index is not None:
+                lexical_index.remove(ids)
+        return len(ids)
+    
+    except Exception as e:
+        raise RuntimeError(f"Failed to remove document: {str(e)}")
+
+
+def has_document(vector_store, doc_id):
+    """
+    Check whether the knowledge base still holds chunks of a document
+    
+    Args:
+        vector_store: Chroma vector store
+        doc_id (str): Document id to look for
+    
+    Returns:
+        bool: True if at least one chunk of the document is stored
+    
+    Raises:
+        RuntimeError: If the lookup fails
+    """
+    try:
+        results = vector_store.get(where={"doc_id": doc_id}, limit=1, include=[])
+        return bool(results.get("ids"))
+    
+    except Exception as e:
+        raise RuntimeError(f"Failed to look up document: {str(e)}")
+
+
+def reciprocal_rank_fusion(ranked_lists, k=RRF_K):
+    """
+    Fuse several ranked lists of ids with reciprocal rank fusion
+    
+    Args:
+        ranked_lists (list): Lists of ids, each ordered best first
+        k (int): RRF constant dampening the weight of top ranks
+    
+    Returns:
+        list: Ids ordered by fused score, best first
+    """
+    scores = {}
+    for ranked_ids in ranked_lists:
+        for rank, item_id in enumerate(ranked_ids):
+            scores[item_id] = scores.get(item_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+def vector_search(query, vector_store, k=MAX_RETRIEVED_DOCS, doc_ids=None, mode=RETRIEVAL_MODE):
+    """
+    Retrieve documents by vector similarity using the configured retrieval mode
+    
+    Args:
+        query (str): User query
+        vector_store: Chroma vector store
+        k (int): Maximum number of documents to return
+        doc_ids (list): Optional document ids to restrict retrieval to
+        mode (str): "similarity", "mmr" or "threshold"
+    
+    Returns:
+        list: List of relevant Document objects (may be empty in "threshold" mode)
+    
+    Raises:
+        ValueError: If the retrieval mode is unknown
+    """
+    search_filter = {"doc_id": {"$in": list(doc_ids)}} if doc_ids else None
+    
+    if mode == "similarity":
+        return vector_store.similarity_search(query, k=k, filter=search_filter)
+    
+    if mode == "mmr":
+        return vector_store.max_marginal_relevance_search(
+            query,
+            k=k,
+            fetch_k=max(k, MMR_FETCH_K),
+            lambda_mult=MMR_LAMBDA,
+            filter=search_filter
+        )
+    
+    if mode == "threshold":
+        scored_docs = vector_store.similarity_search_with_relevance_scores(query, k=k, filter=search_filter)
+        return [doc for doc, score in scored_docs if score >= RETRIEVAL_SCORE_THRESHOLD]
+    
+    raise ValueError(f"Unsupported retrieval mode: {mode}")
+
+
+def hybrid_search(query, vector_store, k=MAX_RETRIEVED_DOCS, doc_ids=None,
+                  vector_k=HYBRID_VECTOR_K, lexical_k=HYBRID_LEXICAL_K, mode=RETRIEVAL_MODE):
+    """
+    Retrieve documents by fusing vector similarity and BM25 lexical search
+    
+    Lexical hits catch exact terms (formula names, code identifiers) that
+    embeddings miss, which lets the vector side use a smaller k. In
+    "threshold" mode, a query with no vector hit above the cutoff is treated
+    as off-topic and returns no documents, lexical hits included.
+    
+    Args:
+        query (str): User query
+        vector_store: Chroma vector store
+        k (int): Number of documents to return
+        doc_ids (list): Optional document ids to restrict retrieval to
+        vector_k (int): Number of vector hits to fuse
+        lexical_k (int): Number of lexical hits to fuse
+        mode (str): Retrieval mode for the vector side
+    
+    Returns:
+        list: List of relevant Document objects
+    """
+    vector_docs = vector_search(query, vector_store, k=vector_k, doc_ids=doc_ids, mode=mode)
+    if mode == "threshold" and not vector_docs:
+        return []
+    
+    documents = {}
+    vector_ids = []
+    for doc in vector_docs:
+        chunk_id = doc.metadata.get("chunk_hash") or compute_chunk_id(doc)
+        documents[chunk_id] = doc
+        vector_ids.append(chunk_id)
+    
+    lexical_hits = get_lexical_index(vector_store).search(query, lexical_k, doc_ids=doc_ids)
+    lexical_ids = [chunk_id for chunk_id, score in lexical_hits]
+    
+    # Fetch text only for lexical hits the vector side did not already return
+    missing_ids = [chunk_id for chunk_id in lexical_ids if chunk_id not in documents]
+    if missing_ids:
+        fetched = vector_store.get(ids=missing_ids, include=["documents", "metadatas"])
+        for chunk_id, text, metadata in zip(fetched["ids"], fetched["documents"], fetched["metadatas"]):
+            documents[chunk_id] = Document(page_content=text, metadata=metadata or {})
+    
+    fused_ids = reciprocal_rank_fusion([vector_ids, lexical_ids])
+    return [documents[chunk_id] for chunk_id in fused_ids if chunk_id in documents][:k]
+
+
+def retrieve_relevant_docs(query, vector_store, k=MAX_RETRIEVED_DOCS, doc_ids=None, mode=RETRIEVAL_MODE):
     """
     Retrieve relevant documents from vector store based on query
     
+    Uses hybrid vector + lexical search when HYBRID_SEARCH_ENABLED is set,
+    plain vector search otherwise. The vector side follows the retrieval
+    mode (RETRIEVAL_MODE): plain similarity, MMR, or a relevance threshold
+    that returns no documents for off-topic questions.
+    
     Args:
         query (str): User query
         vector_store: Vector store object
         k (int): Number of documents to retrieve
+        doc_ids (list): Optional document ids to restrict retrieval to
+        mode (str): "similarity", "mmr" or "threshold"
     
     Returns:
         list: List of relevant Document objects
@@ -151,13 +707,149 @@ def retrieve_relevant_docs(query, vector_store, k=MAX_RETRIEVED_DOCS):
         RuntimeError: If retrieval fails
     """
     try:
-        relevant_docs = vector_store.similarity_search(query, k=k)
+        if HYBRID_SEARCH_ENABLED:
+            return hybrid_search(query, vector_store, k=k, doc_ids=doc_ids, mode=mode)
+        
+        relevant_docs = vector_search(query, vector_store, k=k, doc_ids=doc_ids, mode=mode)
         return relevant_docs
     
     except Exception as e:
         raise RuntimeError(f"Failed to retrieve documents: {str(e)}")
 
 
+def _text_overlap(first, second):
+    """
+    Length of the longest suffix of first that is also a prefix of second
+    
+    Splitter overlap is either whole trailing blocks, which may be a single
+    short line, or a token window inside an oversized block. A match must
+    start on a block boundary of first or be at least MIN_TEXT_OVERLAP
+    characters long, so a stray shared word or full stop does not merge
+    unrelated chunks.
+    """
+    probe = second.split("\n\n", 1)[0][:MIN_TEXT_OVERLAP]
+    if not probe:
+        return 0
+    
+    index = first.find(probe)
+    while index != -1:
+        overlap = len(first) - index
+        at_boundary = index == 0 or first.endswith("\n\n", 0, index)
+        if (at_boundary or overlap >= MIN_TEXT_OVERLAP) and second.startswith(first[index:]):
+            return overlap
+        index = first.find(probe, index + 1)
+    return 0
+
+
+def _merge_into(entry, doc):
+    """
+    Try to fold a chunk into a kept chunk from the same source and page
+    
+    Returns True if the chunk was absorbed (duplicate, contained, overlapping
+    or directly adjacent), False if it must be kept separately.
+    """
+    text = doc.page_content
+    index = doc.metadata.get("chunk_index")
+    
+    if text in entry["text"]:
+        return True
+    if entry["text"] in text:
+        entry["text"] = text
+        return True
+    
+    overlap = _text_overlap(entry["text"], text)
+    if overlap or (index is not None and index == entry["last"] + 1):
+        entry["text"] = entry["text"] + ("" if overlap else "\n\n") + text[overlap:]
+        entry["last"] = index if index is not None else entry["last"]
+        return True
+    
+    overlap = _text_overlap(text, entry["text"])
+    if overlap or (index is not None and index == entry["first"] - 1):
+        entry["text"] = text + ("" if overlap else "\n\n") + entry["text"][overlap:]
+        entry["first"] = index if index is not None else entry["first"]
+        return True
+    
+    return False
+
+
+def rerank_docs(query, docs, model_name=RERANKER_MODEL):
+    """
+    Re-order documents by cross-encoder relevance to the query
+    
+    Args:
+        query (str): User query
+        docs (list): List of Document objects
+        model_name (str): Cross-encoder model name; None keeps the original order
+    
+    Returns:
+        list: Documents, most relevant first
+    """
+    if not model_name or len(docs) < 2:
+        return docs
+    
+    try:
+        scores = get_reranker_model(model_name).predict([(query, doc.page_content) for doc in docs])
+    except Exception:
+        # Retrieval order is a reasonable fallback when the re-ranker is unavailable
+        return docs
+    
+    order = sorted(range(len(docs)), key=lambda i: scores[i], reverse=True)
+    return [docs[i] for i in order]
+
+
+def compress_docs(query, docs, token_budget=CONTEXT_TOKEN_BUDGET, max_docs=MAX_RETRIEVED_DOCS):
+    """
+    Shrink retrieved documents to the text worth putting in the prompt
+    
+    Chunks whose text is already covered by a higher-ranked chunk are
+    dropped, and chunks from the same source and page that overlap or are
+    adjacent are merged into one passage, so the chunk overlap is not
+    repeated. The passages are optionally re-ranked (RERANKER_MODEL), and
+    kept in order while they fit in token_budget.
+    
+    Args:
+        query (str): User query
+        docs (list): Retrieved Document objects, best first
+        token_budget (int): Maximum tokens of document text to keep
+        max_docs (int): Maximum number of passages to keep
+    
+    Returns:
+        list: Compressed Document objects
+    """
+    entries = []
+    for doc in docs:
+        source = (doc.metadata.get("doc_id") or doc.metadata.get("source"), doc.metadata.get("page"))
+        if any(entry["source"] == source and _merge_into(entry, doc) for entry in entries):
+            continue
+        
+        index = doc.metadata.get("chunk_index")
+        entries.append({
+            "source": source,
+            "text": doc.page_content,
+            "metadata": doc.metadata,
+            "first": index if index is not None else -2,
+            "last": index if index is not None else -2
+        })
+    
+    passages = [Document(page_content=entry["text"], metadata=entry["metadata"]) for entry in entries]
+    passages = rerank_docs(query, passages)[:max_docs]
+    
+    compressed = []
+    remaining = token_budget
+    for passage in passages:
+        tokens = count_tokens(passage.page_content)
+        if tokens <= remaining:
+            compressed.append(passage)
+            remaining -= tokens
+        elif not compressed:
+            # Always keep the head of the best passage
+            text = decode(encode(passage.page_content)[:remaining])
+            compressed.append(Document(page_content=text, metadata=passage.metadata))
+            break
+    
+    return compressed
+
+
 def format_docs_for_context(docs):
     """
     Format retrieved documents into a context string
@@ -179,34 +871,74 @@ def format_docs_for_context(docs):
         raise RuntimeError(f"Failed to format documents: {str(e)}")
 
 
-def process_uploaded_file(uploaded_file, save_directory="uploaded_docs"):
+def ingest_uploaded_file(uploaded_file, vector_store, batch_size=INGEST_BATCH_SIZE,
+                         max_workers=INGEST_MAX_CONCURRENCY, progress_callback=None):
     """
-    Process an uploaded file and prepare it for RAG
+    Stream an uploaded file into the vector store without writing it to disk
+    
+    Pages are read from the in-memory upload one at a time and split into
+    chunks; as soon as batch_size chunks are waiting they are embedded (a
+    large page's chunks go in together, max_workers batches at a time).
+    Peak memory stays bounded by one page's chunks, and the first chunks are
+    searchable before the whole file has been parsed.
     
     Args:
         uploaded_file: Streamlit uploaded file object
-        save_directory (str): Directory to save uploaded files
+        vector_store: Chroma vector store to add chunks to
+        batch_size (int): Number of chunks embedded per request
+        max_workers (int): Maximum number of batches embedded concurrently
+        progress_callback (callable): Optional callback(chunks_done, chunks_found)
+            invoked as batches are embedded; chunks_found grows while pages are read
     
     Returns:
-        tuple: (file_path, documents, chunks)
+        dict: {"doc_id", "name", "chunks", "added"}
     
     Raises:
-        RuntimeError: If processing fails
+        RuntimeError: If ingestion fails
     """
     try:
-        # Create directory if it doesn't exist
-        os.makedirs(save_directory, exist_ok=True)
+        doc_id = compute_document_id(uploaded_file.getbuffer())
+        _, pages = load_document_pages(uploaded_file, uploaded_file.name)
+        
+        window = []
+        total_chunks = 0
+        flushed = 0
+        added = 0
+        
+        def flush():
+            window_progress = None
+            if progress_callback:
+                # Chunks already in the store are skipped, so count them as done straight away
+                def window_progress(done, new_in_window):
+                    progress_callback(flushed + len(window) - new_in_window + done, total_chunks)
+            return add_documents_to_vector_store(
+                vector_store, window, batch_size, max_workers, progress_callback=window_progress
+            )
+        
+        if progress_callback:
+            progress_callback(0, 0)
         
-        # Save uploaded file
-        file_path = os.path.join(save_directory, uploaded_file.name)
-        with open(file_path, "wb") as f:
-            f.write(uploaded_file.getbuffer())
+        for page in pages:
+            page.metadata["doc_id"] = doc_id
+            page.metadata["document_name"] = uploaded_file.name
+            chunks = split_documents([page])
+            window.extend(chunks)
+            total_chunks += len(chunks)
+            
+            if len(window) >= batch_size:
+                added += flush()
+                flushed += len(window)
+                window = []
         
-        # Load and split documents
-        documents = load_document(file_path)
-        chunks = split_documents(documents)
+        if window:
+            added += flush()
         
-        return file_path, documents, chunks
+        return {
+            "doc_id": doc_id,
+            "name": uploaded_file.name,
+            "chunks": total_chunks,
+            "added": added
+        }
     
     except Exception as e:
-        raise RuntimeError(f"Failed to process uploaded file: {str(e)}")
+        raise RuntimeError(f"Failed to ingest uploaded file: {str(e)}")
@@ -0,0 +1,168 @@
+import os
+import sys
+import re
+import math
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Add parent directory to path for imports
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+from config.config import (
+    RESPONSE_CACHE_ENABLED,
+    RESPONSE_CACHE_MAX_ENTRIES,
+    RESPONSE_CACHE_TTL_SECONDS,
+    RESPONSE_CACHE_SEMANTIC_ENABLED,
+    RESPONSE_CACHE_SIMILARITY_THRESHOLD
+)
+
+# Process-wide cache shared by all sessions: key -> entry dict
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def normalize_query(query):
+    """
+    Normalize a query so trivially different phrasings share a cache entry
+
+    Args:
+        query (str): User query
+
+    Returns:
+        str: Lowercased query with collapsed whitespace and no trailing punctuation
+    """
+    normalized = re.sub(r"\s+", " ", query.lower()).strip()
+    return normalized.rstrip("?!. ")
+
+
+def fingerprint(*parts):
+    """
+    Compute a short stable fingerprint of some text parts
+
+    Args:
+        *parts (str): Texts to fingerprint (e.g. retrieved context, history)
+
+    Returns:
+        str: Hex digest
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update((part or "").encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+def _cosine_similarity(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+def _evict_expired(now):
+    """Drop expired entries; caller must hold _cache_lock"""
+    for key in [key for key, entry in _cache.items() if now - entry["created"] > RESPONSE_CACHE_TTL_SECONDS]:
+        del _cache[key]
+
+
+def get_cached_response(query, response_mode, provider, context_fingerprint, embedding_model=None):
+    """
+    Look up a cached answer for a query
+
+    An exact match on the normalized query is tried first. If the semantic
+    tier is enabled and an embedding model is given, the closest cached query
+    with the same mode, provider and context is used when its cosine
+    similarity reaches RESPONSE_CACHE_SIMILARITY_THRESHOLD.
+
+    Args:
+        query (str): User query
+        response_mode (str): Response mode ("Concise" or "Detailed")
+        provider (str): Model provider
+        context_fingerprint (str): Fingerprint of retrieved context and history
+        embedding_model: Optional embedding model for the semantic tier
+
+    Returns:
+        str: Cached response, or None on a miss
+    """
+    if not RESPONSE_CACHE_ENABLED:
+        return None
+
+    namespace = (response_mode, provider, context_fingerprint)
+    key = fingerprint(normalize_query(query), *namespace)
+    now = time.time()
+
+    with _cache_lock:
+        _evict_expired(now)
+        entry = _cache.get(key)
+        if entry is not None:
+            _cache.move_to_end(key)
+            return entry["response"]
+
+    if not (RESPONSE_CACHE_SEMANTIC_ENABLED and embedding_model is not None):
+        return None
+
+    try:
+        query_embedding = embedding_model.embed_query(normalize_query(query))
+    except Exception:
+        return None
+
+    best_key, best_score = None, RESPONSE_CACHE_SIMILARITY_THRESHOLD
+    with _cache_lock:
+        for candidate_key, entry in _cache.items():
+            if entry["namespace"] != namespace or entry["embedding"] is None:
+                continue
+            score = _cosine_similarity(query_embedding, entry["embedding"])
+            if score >= best_score:
+                best_key, best_score = candidate_key, score
+
+        if best_key is not None:
+            _cache.move_to_end(best_key)
+            return _cache[best_key]["response"]
+
+    return None
+
+
+def store_response(query, response_mode, provider, context_fingerprint, response, embedding_model=None):
+    """
+    Cache an answer, evicting the least recently used entry when full
+
+    Args:
+        query (str): User query
+        response_mode (str): Response mode ("Concise" or "Detailed")
+        provider (str): Model provider
+        context_fingerprint (str): Fingerprint of retrieved context and history
+        response (str): Model response to cache
+        embedding_model: Optional embedding model for the semantic tier
+    """
+    if not RESPONSE_CACHE_ENABLED or not response:
+        return
+
+    namespace = (response_mode, provider, context_fingerprint)
+    key = fingerprint(normalize_query(query), *namespace)
+
+    embedding = None
+    if RESPONSE_CACHE_SEMANTIC_ENABLED and embedding_model is not None:
+        try:
+            embedding = embedding_model.embed_query(normalize_query(query))
+        except Exception:
+            embedding = None
+
+    with _cache_lock:
+        _cache[key] = {
+            "response": response,
+            "created": time.time(),
+            "namespace": namespace,
+            "embedding": embedding
+        }
+        _cache.move_to_end(key)
+        while len(_cache) > RESPONSE_CACHE_MAX_ENTRIES:
+            _cache.popitem(last=False)
+
+
+def clear_response_cache():
+    """Drop every cached response"""
+    with _cache_lock:
+        _cache.clear()
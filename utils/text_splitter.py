@@ -0,0 +1,233 @@
+import os
+import sys
+import re
+import threading
+
+from langchain_core.documents import Document
+
+# Add parent directory to path for imports
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+from utils.token_utils import encode, decode
+from config.config import CHUNK_SIZE_TOKENS, CHUNK_OVERLAP_TOKENS
+
+HEADING_PATTERN = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+FENCE_PATTERN = re.compile(r"^\s*(```|~~~)")
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?])\s+")
+
+# Tokens assumed for the blank line joining two blocks in a chunk
+BLOCK_SEPARATOR = "\n\n"
+SEPARATOR_TOKENS = 1
+
+# Process-wide splitters, keyed by (chunk_tokens, overlap_tokens)
+_splitters = {}
+_splitters_lock = threading.Lock()
+
+
+class TokenTextSplitter:
+    """
+    Structure-aware splitter that sizes chunks in model tokens
+    
+    Text is read once, line by line, into blocks: paragraphs, fenced code
+    blocks and Markdown headings. Each block is encoded once and blocks are
+    packed greedily into chunks of at most chunk_tokens, so consecutive
+    small sections share a chunk; a new chunk starts only when the budget
+    overflows. A heading is never left at the end of a chunk, and the
+    heading path where a chunk starts is recorded as its "section". Blocks
+    larger than a chunk are split on sentences and, failing that, on token
+    windows. A chunk that continues a section repeats up to overlap_tokens
+    of trailing whole blocks from the previous one.
+    
+    Each Document is split on its own, so chunks never span PDF pages.
+    """
+    
+    def __init__(self, chunk_tokens=CHUNK_SIZE_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+        if overlap_tokens >= chunk_tokens:
+            raise ValueError("overlap_tokens must be smaller than chunk_tokens")
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+    
+    def _iter_blocks(self, text):
+        """Yield (kind, text) for each heading, paragraph or code block in the text"""
+        lines = []
+        in_fence = False
+        
+        for line in text.splitlines():
+            if FENCE_PATTERN.match(line):
+                if in_fence:
+                    lines.append(line)
+                    yield "block", "\n".join(lines)
+                    lines = []
+                    in_fence = False
+                    continue
+                if lines:
+                    yield "block", "\n".join(lines)
+                lines = [line]
+                in_fence = True
+                continue
+            
+            if in_fence:
+                lines.append(line)
+                continue
+            
+            if not line.strip():
+                if lines:
+                    yield "block", "\n".join(lines)
+                    lines = []
+                continue
+            
+            if HEADING_PATTERN.match(line):
+                if lines:
+                    yield "block", "\n".join(lines)
+                    lines = []
+                yield "heading", line.strip()
+                continue
+            
+            lines.append(line)
+        
+        if lines:
+            yield "block", "\n".join(lines)
+    
+    def _split_oversized(self, text, tokens, limit):
+        """Break a block larger than limit tokens into (text, token count) pieces that fit"""
+        pieces = []
+        sentences = SENTENCE_PATTERN.split(text)
+        if len(sentences) == 1:
+            sentences = text.split("\n")
+        
+        for sentence in sentences:
+            sentence_tokens = encode(sentence) if len(sentences) > 1 else tokens
+            if len(sentence_tokens) <= limit:
+                pieces.append((sentence, len(sentence_tokens)))
+                continue
+            
+            stride = limit - self.overlap_tokens
+            for start in range(0, len(sentence_tokens), stride):
+                window = sentence_tokens[start:start + limit]
+                pieces.append((decode(window), len(window)))
+                if start + limit >= len(sentence_tokens):
+                    break
+        
+        return pieces
+    
+    def split_text(self, text):
+        """
+        Split text into token-bounded chunks
+        
+        Args:
+            text (str): Text to split
+        
+        Returns:
+            list: (chunk text, section title, token count) tuples
+        """
+        chunks = []
+        section_path = []
+        current = []  # (text, token count, is_heading, section) of blocks in the chunk being built
+        
+        def count(blocks):
+            return sum(tokens for _, tokens, _, _ in blocks) + SEPARATOR_TOKENS * max(0, len(blocks) - 1)
+        
+        def emit(blocks):
+            # A chunk made only of headings carries no content of its own
+            if any(not is_heading for _, _, is_heading, _ in blocks):
+                chunks.append((BLOCK_SEPARATOR.join(piece for piece, _, _, _ in blocks), blocks[0][3], count(blocks)))
+        
+        for kind, block in self._iter_blocks(text):
+            tokens = encode(block)
+            is_heading = kind == "heading"
+            
+            if is_heading:
+                level, title = HEADING_PATTERN.match(block).groups()
+                del section_path[len(level) - 1:]
+                section_path.append(title)
+                pieces = [(block, len(tokens))]
+            else:
+                # Headings waiting at the end of the chunk will lead the one this block
+                # starts, so size the block to fit after them
+                limit = self.chunk_tokens
+                for previous in reversed(current):
+                    if not previous[2]:
+                        break
+                    limit -= previous[1] + SEPARATOR_TOKENS
+                if limit <= self.overlap_tokens:
+                    limit = self.chunk_tokens
+                
+                if len(tokens) <= limit:
+                    pieces = [(block, len(tokens))]
+                else:
+                    pieces = self._split_oversized(block, tokens, limit)
+            
+            section = " > ".join(section_path)
+            for piece, piece_tokens in pieces:
+                if current and count(current) + SEPARATOR_TOKENS + piece_tokens > self.chunk_tokens:
+                    # Headings at the end of a full chunk belong with the text that follows them
+                    carried = []
+                    while current and current[-1][2]:
+                        carried.insert(0, current.pop())
+                    emit(current)
+                    
+                    if carried or is_heading:
+                        # A new section starts here; no overlap from the previous one
+                        current = carried
+                    else:
+                        # Carry trailing whole blocks forward as overlap
+                        overlap = []
+                        for previous in reversed(current):
+                            if count([previous] + overlap) > self.overlap_tokens:
+                                break
+                            overlap.insert(0, previous)
+                        if overlap and count(overlap) + SEPARATOR_TOKENS + piece_tokens > self.chunk_tokens:
+                            overlap = []
+                        current = overlap
+                
+                current.append((piece, piece_tokens, is_heading, section))
+        
+        emit(current)
+        return chunks
+    
+    def split_documents(self, documents):
+        """
+        Split documents into chunks, keeping their metadata
+        
+        Each chunk gets a "chunk_index" within its source document and, when
+        it falls under a Markdown heading, a "section" title path.
+        
+        Args:
+            documents (list): List of Document objects
+        
+        Returns:
+            list: List of chunked Document objects
+        """
+        chunks = []
+        for document in documents:
+            for index, (text, section, _) in enumerate(self.split_text(document.page_content)):
+                metadata = dict(document.metadata)
+                metadata["chunk_index"] = index
+                if section:
+                    metadata["section"] = section
+                chunks.append(Document(page_content=text, metadata=metadata))
+        return chunks
+
+
+def get_text_splitter(chunk_tokens=CHUNK_SIZE_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    """
+    Get a shared splitter for the given chunk and overlap sizes
+    
+    Args:
+        chunk_tokens (int): Maximum tokens per chunk
+        overlap_tokens (int): Maximum tokens shared by consecutive chunks
+    
+    Returns:
+        TokenTextSplitter: Splitter instance, created once per process
+    """
+    key = (chunk_tokens, overlap_tokens)
+    splitter = _splitters.get(key)
+    if splitter is None:
+        with _splitters_lock:
+            splitter = _splitters.get(key)
+            if splitter is None:
+                splitter = TokenTextSplitter(chunk_tokens, overlap_tokens)
+                _splitters[key] = splitter
+    return splitter
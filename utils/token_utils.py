@@ -0,0 +1,95 @@
+import os
+import sys
+import re
+import threading
+import warnings
+
+# Add parent directory to path for imports
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+from config.config import TIKTOKEN_ENCODING
+
+# Approximate tokenizer used when the tiktoken encoding cannot be loaded (e.g. offline)
+FALLBACK_TOKEN_PATTERN = re.compile(r"\S+\s*|\s+")
+
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+
+def get_encoding():
+    """
+    Get the shared tiktoken encoding, loading it once per process
+
+    If the encoding cannot be loaded, a warning is issued once and token
+    counts fall back to FALLBACK_TOKEN_PATTERN, which counts words and
+    whitespace runs rather than model tokens.
+
+    Returns:
+        tiktoken.Encoding: Encoding, or None if tiktoken is unavailable
+    """
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        with _encoding_lock:
+            if not _encoding_loaded:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding(TIKTOKEN_ENCODING)
+                except Exception as e:
+                    _encoding = None
+                    warnings.warn(
+                        f"Failed to load tiktoken encoding '{TIKTOKEN_ENCODING}': {str(e)}. "
+                        "Token counts and chunk sizes are approximated by counting words.",
+                        RuntimeWarning
+                    )
+                _encoding_loaded = True
+    return _encoding
+
+
+def encode(text):
+    """
+    Split text into tokens
+
+    Args:
+        text (str): Text to encode
+
+    Returns:
+        list: Tokens (tiktoken ids, or text pieces with the fallback tokenizer)
+    """
+    encoding = get_encoding()
+    if encoding is not None:
+        return encoding.encode(text, disallowed_special=())
+    return FALLBACK_TOKEN_PATTERN.findall(text)
+
+
+def decode(tokens):
+    """
+    Turn tokens produced by encode back into text
+
+    Args:
+        tokens (list): Tokens from encode
+
+    Returns:
+        str: Decoded text
+    """
+    encoding = get_encoding()
+    if encoding is not None:
+        return encoding.decode(tokens)
+    return "".join(tokens)
+
+
+def count_tokens(text):
+    """
+    Count the tokens in a text
+
+    Args:
+        text (str): Text to measure
+
+    Returns:
+        int: Number of tokens
+    """
+    if not text:
+        return 0
+    return len(encode(text))
@@ -1,23 +1,121 @@
 import os
 import sys
+import re
+import time
+import random
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 import requests
+from requests.adapters import HTTPAdapter
 
 # Add parent directory to path for imports
 current_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(current_dir)
 sys.path.insert(0, parent_dir)
 
-from config.config import SERPER_API_KEY, MAX_SEARCH_RESULTS
+from config.config import (
+    SERPER_API_KEY,
+    MAX_SEARCH_RESULTS,
+    SEARCH_BACKEND,
+    SEARCH_TIMEOUT_SECONDS,
+    SEARCH_POOL_SIZE,
+    SEARCH_CACHE_TTL_SECONDS,
+    SEARCH_CACHE_MAX_ENTRIES,
+    SEARCH_MAX_RETRIES,
+    SEARCH_BACKOFF_BASE_SECONDS,
+    SEARCH_MIN_ATTEMPT_SECONDS,
+    SEARCH_HEDGE_DELAY_SECONDS,
+    SEARCH_BREAKER_FAILURE_THRESHOLD,
+    SEARCH_BREAKER_COOLDOWN_SECONDS
+)
 
+SERPER_URL = "https://google.serper.dev/search"
 
-def search_web(query, num_results=MAX_SEARCH_RESULTS):
+# Whole-word keywords that suggest a query needs current information
+FRESHNESS_KEYWORDS = [
+    "latest", "recent", "current", "today", "now", "news",
+    "2024", "2025", "this year", "update", "new"
+]
+FRESHNESS_PATTERN = re.compile(r"\b(?:" + "|".join(re.escape(keyword) for keyword in FRESHNESS_KEYWORDS) + r")\b")
+
+# Pooled HTTP session shared by all searches in the process (keep-alive connection reuse)
+_session = None
+_session_lock = threading.Lock()
+
+# TTL cache of raw search results: (backend, query, num_results) -> (timestamp, results)
+_search_cache = OrderedDict()
+_search_cache_lock = threading.Lock()
+
+# Circuit breaker state shared by all sessions
+_breaker = {"failures": 0, "open_until": 0.0}
+_breaker_lock = threading.Lock()
+
+# Workers for hedged (duplicate) search requests
+_hedge_executor = ThreadPoolExecutor(max_workers=SEARCH_POOL_SIZE, thread_name_prefix="search")
+
+
+class SearchRetryableError(RuntimeError):
+    """Search failure worth retrying (rate limit, timeout, server error)"""
+
+
+class SearchUnavailableError(RuntimeError):
+    """Search skipped because the circuit breaker is open or the latency budget is spent"""
+
+
+def get_search_session():
     """
-    Perform a web search using Serper API
+    Get the shared pooled HTTP session used for search requests
+    
+    Returns:
+        requests.Session: Session with a keep-alive connection pool
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=SEARCH_POOL_SIZE, pool_maxsize=SEARCH_POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+
+def stub_search(query, num_results=MAX_SEARCH_RESULTS, timeout=None):
+    """
+    Offline search backend returning deterministic fake results (for tests)
     
     Args:
         query (str): Search query
         num_results (int): Number of results to return
+        timeout (float): Ignored; accepted for interface compatibility
+    
+    Returns:
+        dict: Search results in the Serper response format
+    """
+    return {
+        "searchParameters": {"q": query, "num": num_results},
+        "organic": [
+            {
+                "title": f"Result {i} for {query}",
+                "link": f"https://example.com/search/{i}",
+                "snippet": f"Stub search result {i} for the query: {query}"
+            }
+            for i in range(1, num_results + 1)
+        ]
+    }
+
+
+def serper_search(query, num_results=MAX_SEARCH_RESULTS, timeout=SEARCH_TIMEOUT_SECONDS):
+    """
+    Perform a web search request against the Serper API
+    
+    Args:
+        query (str): Search query
+        num_results (int): Number of results to return
+        timeout (float): Request timeout in seconds
     
     Returns:
         dict: Search results containing organic results and information
@@ -29,8 +127,6 @@ def search_web(query, num_results=MAX_SEARCH_RESULTS):
         if not SERPER_API_KEY or SERPER_API_KEY == "":
             raise ValueError("Serper API key not found. Please set SERPER_API_KEY in config.py or environment variables.")
         
-        url = "https://google.serper.dev/search"
-        
         payload = {
             "q": query,
             "num": num_results
@@ -41,7 +137,7 @@ def search_web(query, num_results=MAX_SEARCH_RESULTS):
             "Content-Type": "application/json"
         }
         
-        response = requests.post(url, json=payload, headers=headers, timeout=10)
+        response = get_search_session().post(SERPER_URL, json=payload, headers=headers, timeout=timeout)
         
         # Check response status
         if response.status_code == 400:
@@ -49,20 +145,204 @@ def search_web(query, num_results=MAX_SEARCH_RESULTS):
         elif response.status_code == 403:
             raise RuntimeError(f"Serper API key is invalid or unauthorized.")
         elif response.status_code == 429:
-            raise RuntimeError(f"Serper API rate limit exceeded. Please try again later.")
+            raise SearchRetryableError(f"Serper API rate limit exceeded. Please try again later.")
+        elif response.status_code >= 500:
+            raise SearchRetryableError(f"Serper API server error ({response.status_code}).")
         
         response.raise_for_status()
         
         return response.json()
     
+    except RuntimeError:
+        raise
     except requests.exceptions.Timeout:
-        raise RuntimeError(f"Web search request timed out. Please try again.")
+        raise SearchRetryableError(f"Web search request timed out. Please try again.")
+    except requests.exceptions.ConnectionError as e:
+        raise SearchRetryableError(f"Web search failed: {str(e)}")
     except requests.exceptions.RequestException as e:
         raise RuntimeError(f"Web search failed: {str(e)}")
     except Exception as e:
         raise RuntimeError(f"Web search failed: {str(e)}")
 
 
+SEARCH_BACKENDS = {
+    "serper": serper_search,
+    "stub": stub_search
+}
+
+
+def _breaker_allows_request():
+    """Check whether the circuit breaker currently lets a search through"""
+    with _breaker_lock:
+        return time.monotonic() >= _breaker["open_until"]
+
+
+def _record_search_result(success):
+    """Update the circuit breaker after a search call"""
+    with _breaker_lock:
+        if success:
+            _breaker["failures"] = 0
+            _breaker["open_until"] = 0.0
+        else:
+            _breaker["failures"] += 1
+            if _breaker["failures"] >= SEARCH_BREAKER_FAILURE_THRESHOLD:
+                _breaker["open_until"] = time.monotonic() + SEARCH_BREAKER_COOLDOWN_SECONDS
+
+
+def _hedged_call(search_function, query, num_results, timeout):
+    """
+    Run a search, sending a duplicate request if the first is slow
+    
+    With SEARCH_HEDGE_DELAY_SECONDS unset (or not shorter than the timeout)
+    this is a plain single call.
+    """
+    hedge_delay = SEARCH_HEDGE_DELAY_SECONDS
+    if hedge_delay is None or hedge_delay >= timeout:
+        return search_function(query, num_results, timeout)
+    
+    started = time.monotonic()
+    futures = [_hedge_executor.submit(search_function, query, num_results, timeout)]
+    done, _ = wait(futures, timeout=hedge_delay)
+    if not done:
+        futures.append(_hedge_executor.submit(search_function, query, num_results, timeout - hedge_delay))
+    
+    error = None
+    pending = set(futures)
+    while pending:
+        remaining = timeout - (time.monotonic() - started)
+        done, pending = wait(pending, timeout=max(0.0, remaining), return_when=FIRST_COMPLETED)
+        if not done:
+            break
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            error = future.exception()
+    
+    raise error or SearchRetryableError("Web search request timed out. Please try again.")
+
+
+def resilient_search(query, num_results=MAX_SEARCH_RESULTS, backend=SEARCH_BACKEND, deadline=None):
+    """
+    Call a search backend with retries, hedging, a circuit breaker and a latency budget
+    
+    Rate limits, timeouts and server errors are retried with exponential
+    backoff while the budget allows. After SEARCH_BREAKER_FAILURE_THRESHOLD
+    consecutive failed searches (a search counts once, however many attempts
+    it made), search is short-circuited for
+    SEARCH_BREAKER_COOLDOWN_SECONDS so a degraded provider cannot keep
+    adding its timeout to every turn.
+    
+    Args:
+        query (str): Search query
+        num_results (int): Number of results to return
+        backend (str): Search backend ("serper" or "stub")
+        deadline (float): Optional time.monotonic() deadline for the whole search
+    
+    Returns:
+        dict: Search results
+    
+    Raises:
+        SearchUnavailableError: If the breaker is open or the budget is spent
+        RuntimeError: If search fails
+    """
+    if not _breaker_allows_request():
+        raise SearchUnavailableError("Web search temporarily disabled after repeated failures.")
+    
+    search_function = SEARCH_BACKENDS[backend]
+    for attempt in range(SEARCH_MAX_RETRIES + 1):
+        timeout = SEARCH_TIMEOUT_SECONDS
+        if deadline is not None:
+            timeout = min(timeout, deadline - time.monotonic())
+        if timeout < SEARCH_MIN_ATTEMPT_SECONDS:
+            if attempt:
+                # Earlier attempts failed and there is no time left to retry
+                _record_search_result(False)
+            raise SearchUnavailableError("Web search skipped: latency budget exhausted.")
+        
+        try:
+            results = _hedged_call(search_function, query, num_results, timeout)
+        except SearchRetryableError:
+            delay = SEARCH_BACKOFF_BASE_SECONDS * (2 ** attempt)
+            delay += random.uniform(0, delay / 2)
+            if (attempt >= SEARCH_MAX_RETRIES or not _breaker_allows_request()
+                    or (deadline is not None and time.monotonic() + delay + SEARCH_MIN_ATTEMPT_SECONDS > deadline)):
+                # Only the search as a whole counts towards the breaker, not each retry
+                _record_search_result(False)
+                raise
+            time.sleep(delay)
+            continue
+        except Exception:
+            _record_search_result(False)
+            raise
+        
+        _record_search_result(True)
+        return results
+
+
+def search_web(query, num_results=MAX_SEARCH_RESULTS, backend=SEARCH_BACKEND, deadline=None):
+    """
+    Perform a web search using the configured backend
+    
+    Results are cached for SEARCH_CACHE_TTL_SECONDS keyed by (backend, query,
+    num_results), so repeated searches within the window are served locally.
+    Cache misses go through resilient_search.
+    
+    Args:
+        query (str): Search query
+        num_results (int): Number of results to return
+        backend (str): Search backend ("serper" or "stub")
+        deadline (float): Optional time.monotonic() deadline for the whole search
+    
+    Returns:
+        dict: Search results containing organic results and information
+    
+    Raises:
+        RuntimeError: If search fails
+    """
+    if backend not in SEARCH_BACKENDS:
+        raise RuntimeError(f"Unsupported search backend: {backend}. Choose from {', '.join(SEARCH_BACKENDS)}.")
+    
+    key = (backend, query.strip().lower(), num_results)
+    now = time.monotonic()
+    
+    with _search_cache_lock:
+        cached = _search_cache.get(key)
+        if cached is not None:
+            if now - cached[0] <= SEARCH_CACHE_TTL_SECONDS:
+                _search_cache.move_to_end(key)
+                return cached[1]
+            del _search_cache[key]
+    
+    results = resilient_search(query, num_results, backend, deadline)
+    
+    with _search_cache_lock:
+        _search_cache[key] = (now, results)
+        _search_cache.move_to_end(key)
+        while len(_search_cache) > SEARCH_CACHE_MAX_ENTRIES:
+            _search_cache.popitem(last=False)
+    
+    return results
+
+
+async def async_search_web(query, num_results=MAX_SEARCH_RESULTS, backend=SEARCH_BACKEND, deadline=None):
+    """
+    Async variant of search_web, running the pooled request in a worker thread
+    
+    Args:
+        query (str): Search query
+        num_results (int): Number of results to return
+        backend (str): Search backend ("serper" or "stub")
+        deadline (float): Optional time.monotonic() deadline for the whole search
+    
+    Returns:
+        dict: Search results containing organic results and information
+    
+    Raises:
+        RuntimeError: If search fails
+    """
+    return await asyncio.to_thread(search_web, query, num_results, backend, deadline)
+
+
 def format_search_results(search_results):
     """
     Format search results into a readable context string
@@ -96,23 +376,24 @@ def format_search_results(search_results):
         raise RuntimeError(f"Failed to format search results: {str(e)}")
 
 
-def get_search_context(query, num_results=MAX_SEARCH_RESULTS):
+def get_search_context(query, num_results=MAX_SEARCH_RESULTS, deadline=None):
     """
     Get formatted search context for a query
     
     Args:
         query (str): Search query
         num_results (int): Number of results to retrieve
+        deadline (float): Optional time.monotonic() deadline derived from the request budget
     
     Returns:
         str: Formatted search context or error message
     """
     try:
         # Check if API key is available
-        if not SERPER_API_KEY or SERPER_API_KEY == "":
+        if SEARCH_BACKEND == "serper" and (not SERPER_API_KEY or SERPER_API_KEY == ""):
             return "Web search unavailable: Serper API key not configured."
         
-        search_results = search_web(query, num_results)
+        search_results = search_web(query, num_results, deadline=deadline)
         formatted_context = format_search_results(search_results)
         
         return formatted_context
@@ -126,6 +407,9 @@ def should_use_web_search(query, threshold_keywords=None):
     """
     Determine if a query should trigger a web search
     
+    Keywords are matched as whole words, so "new" does not match "renewable"
+    and "now" does not match "know".
+    
     Args:
         query (str): User query
         threshold_keywords (list): Keywords that suggest need for current information
@@ -135,18 +419,15 @@ def should_use_web_search(query, threshold_keywords=None):
     """
     try:
         if threshold_keywords is None:
-            threshold_keywords = [
-                "latest", "recent", "current", "today", "now", "news",
-                "2024", "2025", "this year", "update", "new"
-            ]
+            pattern = FRESHNESS_PATTERN
+        else:
+            # An empty alternative would match at every word boundary
+            keywords = [keyword for keyword in threshold_keywords if keyword]
+            if not keywords:
+                return False
+            pattern = re.compile(r"\b(?:" + "|".join(re.escape(keyword) for keyword in keywords) + r")\b")
         
-        query_lower = query.lower()
-        
-        for keyword in threshold_keywords:
-            if keyword in query_lower:
-                return True
-        
-        return False
+        return pattern.search(query.lower()) is not None
     
     except Exception as e:
         return False